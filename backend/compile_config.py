@@ -0,0 +1,71 @@
+# compile_config.py - 构建时将 config.py 编译为C扩展
+"""使用 mypyc 把 config.py 编译为C扩展模块（mypy 见 requirements-build.txt）
+
+编译产物（config.*.so / .pyd）与 config.py 位于同一目录时，Python 会优先导入扩展模块。
+编译后在子进程中导入一次，确认加载的是扩展模块且只读配置行为正常；未安装 mypy、没有C编译器、
+编译或检查失败时删除产物，不会中断构建，继续使用 config.py。
+"""
+import glob
+import importlib.machinery
+import os
+import shutil
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 在子进程中导入编译后的模块：必须来自扩展模块，单例、只读和序列化与 config.py 一致
+CHECK_SCRIPT = """
+import importlib.machinery
+import pickle
+import config
+assert config.__file__.endswith(tuple(importlib.machinery.EXTENSION_SUFFIXES)), config.__file__
+assert config.Config() is config.config
+try:
+    config.config.BATCH_SIZE = 0
+except AttributeError:
+    pass
+else:
+    raise AssertionError("编译后的配置可以被修改")
+assert pickle.loads(pickle.dumps(config.config))._asdict() == config.config._asdict()
+assert config.BATCH_SIZE == config.config.BATCH_SIZE
+"""
+
+
+def _artifacts():
+    return [path for suffix in importlib.machinery.EXTENSION_SUFFIXES
+            for path in glob.glob(os.path.join(BASE_DIR, "config*" + suffix))]
+
+
+def _discard():
+    for path in _artifacts():
+        os.remove(path)
+    shutil.rmtree(os.path.join(BASE_DIR, "build"), ignore_errors=True)
+
+
+def main():
+    try:
+        import mypyc  # noqa: F401
+    except ImportError:
+        print("⚠️  未安装 mypy，跳过编译，继续使用 config.py")
+        return
+
+    result = subprocess.run([sys.executable, "-m", "mypyc", "config.py"], cwd=BASE_DIR)
+    if result.returncode != 0 or not _artifacts():
+        _discard()
+        print("⚠️  config.py 编译失败，继续使用 config.py")
+        return
+
+    check = subprocess.run([sys.executable, "-c", CHECK_SCRIPT], cwd=BASE_DIR)
+    if check.returncode != 0:
+        _discard()
+        print("⚠️  编译后的 config 模块检查未通过，已删除，继续使用 config.py")
+        return
+
+    # 只保留扩展模块，删除中间产物
+    shutil.rmtree(os.path.join(BASE_DIR, "build"), ignore_errors=True)
+    print("✅ config.py 已编译为C扩展")
+
+
+if __name__ == "__main__":
+    main()
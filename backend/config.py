@@ -1,76 +1,319 @@
 # config.py - 云部署优化版
+# 注意：本模块被所有后端模块导入，不要在这里（直接或间接）导入 torch/clip 等重量级依赖
+import atexit
 import os
+import pickle
+import sys
+from functools import lru_cache
 from pathlib import Path
+from types import SimpleNamespace
+from typing import Final
 
+# 启动时对环境变量做一次快照，之后只读这份字典
+_ENV: Final = dict(os.environ)
 
-class Config:
-    # ========== 前端配置 ==========
-    WEB_TITLE = "AI智能选片助手"
-    WEB_DESCRIPTION = "自动检测照片质量，支持语义搜索"
-    WEB_FAVICON = "https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css"
-    # ========== 从环境变量读取配置 ==========
+# 本文件及后端目录（abspath 只做字符串运算，不会像 Path.resolve() 那样访问文件系统）
+_THIS_FILE: Final = os.path.abspath(__file__)
+_BASE_DIR_STR: Final = os.path.dirname(_THIS_FILE)
+
+
+# 视为开启的布尔环境变量取值（不区分大小写，忽略首尾空白）
+_TRUE: Final = frozenset({"1", "true", "yes", "on"})
+
+
+def _to_bool(value):
+    return value.strip().lower() in _TRUE
+
+
+# 从环境变量读取的配置：(字段名, 环境变量名, 类型转换, 默认值)
+_SCHEMA: Final = (
     # 性能优化配置
-    MAX_WORKERS = int(os.getenv("MAX_WORKERS", "2"))  # 云环境减少并发
-    BATCH_SIZE = int(os.getenv("BATCH_SIZE", "10"))  # 减小批次大小
-    IMAGE_CACHE_SIZE = int(os.getenv("IMAGE_CACHE_SIZE", "30"))
+    ("MAX_WORKERS", "MAX_WORKERS", int, 2),  # 云环境减少并发
+    ("BATCH_SIZE", "BATCH_SIZE", int, 10),  # 减小批次大小
+    ("IMAGE_CACHE_SIZE", "IMAGE_CACHE_SIZE", int, 30),
+    # 质量检测阈值
+    ("BLUR_THRESHOLD", "BLUR_THRESHOLD", float, 30.0),
+    ("OVEREXPOSURE_THRESHOLD", "OVEREXPOSURE_THRESHOLD", float, 0.95),
+    ("UNDEREXPOSURE_THRESHOLD", "UNDEREXPOSURE_THRESHOLD", float, 0.05),
+    # 图像处理配置
+    ("MAX_IMAGE_SIZE", "MAX_IMAGE_SIZE", int, 500000),  # 云环境减少
+    ("RESIZE_SCALE", "RESIZE_SCALE", float, 0.25),  # 缩小更多
+    # 语义搜索配置
+    ("SEARCH_BATCH_SIZE", "SEARCH_BATCH_SIZE", int, 25),
+    ("SIMILARITY_THRESHOLD", "SIMILARITY_THRESHOLD", float, 0.4),
+    ("VECTOR_SQ8", "VECTOR_SQ8", _to_bool, False),  # 照片较多时向量索引改用8位标量量化（内存约1/4），结果用原始向量精确重排
+    # 服务器配置
+    ("API_HOST", "API_HOST", str, "0.0.0.0"),
+    ("API_PORT", "PORT", int, 8001),  # Railway自动分配
+    ("WEB_HOST", "WEB_HOST", str, "0.0.0.0"),
+    ("WEB_PORT", "WEB_PORT", int, 3000),
+    # 模型配置
+    ("CLIP_MODEL_NAME", "CLIP_MODEL_NAME", str, "ViT-B/32"),
+    ("USE_GPU", "USE_GPU", _to_bool, False),
+    ("USE_BF16", "USE_BF16", _to_bool, False),  # CPU推理使用BF16混合精度（需CPU支持AVX512-BF16/AMX）
+    # 前端URL，用于CORS
+    ("FRONTEND_URL", "FRONTEND_URL", str, "http://localhost:3000"),
+    # 部署在nginx后面时，照片通过 X-Accel-Redirect 交给nginx发送（如 "/protected_photos"），为空则由应用直接发送
+    ("ACCEL_REDIRECT_PREFIX", "ACCEL_REDIRECT_PREFIX", str, ""),
+    # 云存储配置（如S3等）
+    ("USE_CLOUD_STORAGE", "USE_CLOUD_STORAGE", _to_bool, False),
+    ("CLOUD_STORAGE_BUCKET", "CLOUD_STORAGE_BUCKET", str, ""),
+)
+
+
+# 拆分为并行元组，便于用 map 一次性解析
+_NAMES, _ENV_NAMES, _CASTS, _DEFAULTS = zip(*_SCHEMA)
 
-    # ========== 质量检测阈值 ==========
-    BLUR_THRESHOLD = float(os.getenv("BLUR_THRESHOLD", "30.0"))
-    OVEREXPOSURE_THRESHOLD = float(os.getenv("OVEREXPOSURE_THRESHOLD", "0.95"))
-    UNDEREXPOSURE_THRESHOLD = float(os.getenv("UNDEREXPOSURE_THRESHOLD", "0.05"))
 
-    # ========== 图像处理配置 ==========
-    MAX_IMAGE_SIZE = int(os.getenv("MAX_IMAGE_SIZE", "500000"))  # 云环境减少
-    RESIZE_SCALE = float(os.getenv("RESIZE_SCALE", "0.25"))  # 缩小更多
+def _parse(env_name, cast, default):
+    """解析单个环境变量，缺失时返回默认值"""
+    raw = _ENV.get(env_name)
+    if raw is None:
+        return default
+    try:
+        return cast(raw)
+    except ValueError:
+        raise ValueError(f"环境变量 {env_name} 的值无效: {raw!r}") from None
+
+
+def _load_env(fields=None):
+    """按 _SCHEMA 一次性解析环境变量快照，fields 为 None 时解析全部字段"""
+    if fields is None:
+        return dict(zip(_NAMES, map(_parse, _ENV_NAMES, _CASTS, _DEFAULTS)))
+    return {name: _parse(env_name, cast, default)
+            for name, env_name, cast, default in _SCHEMA if name in fields}
+
+
+# 由运行平台在启动时注入、不能在构建时固化的字段
+RUNTIME_FIELDS: Final = ("API_PORT",)
+
+
+# 父进程共享配置时使用的环境变量名（值为 "共享内存名:字节数"）
+_SHM_ENV: Final = "_CONFIG_SHM"
+
+
+class Config:
+    """只读配置单例：字段保存在 __slots__ 中，构造完成后禁止修改
 
-    # ========== 语义搜索配置 ==========
-    SEARCH_BATCH_SIZE = int(os.getenv("SEARCH_BATCH_SIZE", "25"))
-    SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.4"))
+    Config() 总是返回 get_config() 缓存的实例；Config(values) 仅供 get_config 使用。
+    """
+    # Final：mypyc 编译后 get_config 仍可通过类对象读取字段名
+    __slots__: Final = (
+        # ========== 性能优化配置 ==========
+        "MAX_WORKERS", "BATCH_SIZE", "IMAGE_CACHE_SIZE",
+        # ========== 质量检测阈值 ==========
+        "BLUR_THRESHOLD", "OVEREXPOSURE_THRESHOLD", "UNDEREXPOSURE_THRESHOLD",
+        # ========== 图像处理配置 ==========
+        "MAX_IMAGE_SIZE", "RESIZE_SCALE",
+        # ========== 语义搜索配置 ==========
+        "SEARCH_BATCH_SIZE", "SIMILARITY_THRESHOLD", "VECTOR_SQ8",
+        # ========== 路径配置 ==========
+        "BASE_DIR", "DATA_DIR", "STATIC_DIR", "PHOTOS_DIR", "CHROMA_DB_DIR",
+        # ========== 服务器配置 ==========
+        "API_HOST", "API_PORT", "WEB_HOST", "WEB_PORT",
+        # ========== 模型配置 ==========
+        "CLIP_MODEL_NAME", "USE_GPU", "USE_BF16",
+        # ========== 前端配置 ==========
+        "FRONTEND_URL", "ACCEL_REDIRECT_PREFIX",
+        # ========== 云存储配置 ==========
+        "USE_CLOUD_STORAGE", "CLOUD_STORAGE_BUCKET",
+        # ========== 已启用的可选功能（"gpu"、"bf16"、"cloud"），用于按需导入重量级模块 ==========
+        "FEATURES",
+        # ========== 临时文件配置 ==========
+        "TEMP_UPLOAD_DIR",
+        # ========== 路径字符串（供 open/FAISS/StaticFiles 直接使用） ==========
+        "PHOTOS_DIR_STR", "CHROMA_DB_DIR_STR", "STATIC_DIR_STR", "TEMP_UPLOAD_DIR_STR",
+    )
 
-    # ========== 路径配置 ==========
-    # 云部署环境下使用正确的路径
-    BASE_DIR = Path(__file__).parent
+    # 字段类型（供 mypy 检查、mypyc 编译；值由 __init__ 按 __slots__ 写入）
+    MAX_WORKERS: int
+    BATCH_SIZE: int
+    IMAGE_CACHE_SIZE: int
+    BLUR_THRESHOLD: float
+    OVEREXPOSURE_THRESHOLD: float
+    UNDEREXPOSURE_THRESHOLD: float
+    MAX_IMAGE_SIZE: int
+    RESIZE_SCALE: float
+    SEARCH_BATCH_SIZE: int
+    SIMILARITY_THRESHOLD: float
+    VECTOR_SQ8: bool
+    BASE_DIR: Path
+    DATA_DIR: Path
+    STATIC_DIR: Path
+    PHOTOS_DIR: Path
+    CHROMA_DB_DIR: Path
+    API_HOST: str
+    API_PORT: int
+    WEB_HOST: str
+    WEB_PORT: int
+    CLIP_MODEL_NAME: str
+    USE_GPU: bool
+    USE_BF16: bool
+    FRONTEND_URL: str
+    ACCEL_REDIRECT_PREFIX: str
+    USE_CLOUD_STORAGE: bool
+    CLOUD_STORAGE_BUCKET: str
+    FEATURES: frozenset
+    TEMP_UPLOAD_DIR: Path
+    PHOTOS_DIR_STR: str
+    CHROMA_DB_DIR_STR: str
+    STATIC_DIR_STR: str
+    TEMP_UPLOAD_DIR_STR: str
 
-    if os.getenv("RAILWAY_ENVIRONMENT"):
+    def __new__(cls, values=None):
+        if values is None:
+            return get_config()
+        return object.__new__(cls)
+
+    def __init__(self, values=None):
+        if values is None:
+            # Config() 返回的是已构造好的单例，无需再初始化
+            return
+        for name in self.__slots__:
+            object.__setattr__(self, name, values[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"配置为只读，不能修改 {name}")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"配置为只读，不能删除 {name}")
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"Config({fields})"
+
+    def __reduce__(self):
+        return (Config, (self._asdict(),))
+
+    def _asdict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def ensure_dirs(self):
+        """创建数据目录（由API启动时调用一次，避免导入时的文件系统开销）"""
+        global _dirs_ready
+        if _dirs_ready:
+            return
+        # 直接使用字符串路径；makedirs 会一并创建上级的 DATA_DIR
+        for p in (self.PHOTOS_DIR_STR, self.CHROMA_DB_DIR_STR, self.STATIC_DIR_STR, self.TEMP_UPLOAD_DIR_STR):
+            os.makedirs(p, exist_ok=True)
+        _dirs_ready = True
+
+
+# 目录是否已创建（多次调用 ensure_dirs 时只执行一次）
+_dirs_ready = False
+
+
+@lru_cache(maxsize=1)
+def get_config() -> Config:
+    """读取环境变量并生成只读配置（每个进程只执行一次）"""
+    shm_ref = _ENV.get(_SHM_ENV)
+    if shm_ref:
+        # 子进程：直接读取父进程共享的配置，跳过环境变量解析
+        from multiprocessing import shared_memory
+        name, size = shm_ref.rsplit(":", 1)
+        # 子进程只读取不拥有共享内存，不能登记到 resource_tracker，否则退出时会被当作泄漏删除
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            # 3.13 之前没有 track 参数：非 multiprocessing 启动的子进程有自己的 resource_tracker，
+            # 只能借助私有属性判断并在打开后取消登记（multiprocessing 子进程与父进程共用tracker，不取消）
+            from multiprocessing import resource_tracker
+            own_tracker = os.name == "posix" and resource_tracker._resource_tracker._fd is None  # type: ignore[attr-defined]
+            shm = shared_memory.SharedMemory(name=name)
+            if own_tracker:
+                resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+        try:
+            values = pickle.loads(bytes(shm.buf[:int(size)]))  # type: ignore[index]
+        finally:
+            shm.close()
+        return Config(values)
+
+    if _ENV.get("FROZEN_CONFIG"):
+        # 使用构建时由 freeze_config.py 生成的常量，跳过环境变量解析
+        import config_frozen  # type: ignore[import-not-found]
+        frozen = {name: getattr(config_frozen, name) for name in Config.__slots__ if name not in RUNTIME_FIELDS}
+        return Config({**frozen, **_load_env(RUNTIME_FIELDS)})
+
+    # 云部署环境下使用正确的路径（先用字符串拼接，最后再构造 Path）
+    if _ENV.get("RAILWAY_ENVIRONMENT"):
         # Railway环境使用持久化目录
-        DATA_DIR = Path("/data")
-        # 确保静态文件目录存在
-        STATIC_DIR = DATA_DIR / "frontend"
+        data_dir = "/data"
+        static_dir = os.path.join(data_dir, "frontend")
     else:
-        DATA_DIR = BASE_DIR / "data"
-        STATIC_DIR = BASE_DIR / "frontend"
+        data_dir = os.path.join(_BASE_DIR_STR, "data")
+        static_dir = os.path.join(_BASE_DIR_STR, "frontend")
 
-    # 确保目录存在
-    DATA_DIR.mkdir(exist_ok=True)
-    PHOTOS_DIR = DATA_DIR / "photos"
-    PHOTOS_DIR.mkdir(exist_ok=True)
-    CHROMA_DB_DIR = DATA_DIR / "chroma_db"
-    CHROMA_DB_DIR.mkdir(exist_ok=True)
-    STATIC_DIR.mkdir(exist_ok=True)
+    # 目录在启动时由 ensure_dirs() 创建
+    photos_dir = os.path.join(data_dir, "photos")
+    chroma_db_dir = os.path.join(data_dir, "chroma_db")
+    temp_upload_dir = os.path.join(data_dir, "temp_uploads")
 
-    # ========== 服务器配置 ==========
-    API_HOST = os.getenv("API_HOST", "0.0.0.0")
-    API_PORT = int(os.getenv("PORT", "8001"))  # Railway自动分配
-    WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
-    WEB_PORT = int(os.getenv("WEB_PORT", "3000"))
+    values = _load_env()
 
-    # ========== 模型配置 ==========
-    CLIP_MODEL_NAME = os.getenv("CLIP_MODEL_NAME", "ViT-B/32")
-    USE_GPU = os.getenv("USE_GPU", "false").lower() == "true"
+    return Config(dict(
+        BASE_DIR=Path(_BASE_DIR_STR),
+        DATA_DIR=Path(data_dir),
+        STATIC_DIR=Path(static_dir),
+        PHOTOS_DIR=Path(photos_dir),
+        CHROMA_DB_DIR=Path(chroma_db_dir),
+        TEMP_UPLOAD_DIR=Path(temp_upload_dir),
+        FEATURES=frozenset(f for f, on in (
+            ("gpu", values["USE_GPU"]), ("bf16", values["USE_BF16"]), ("cloud", values["USE_CLOUD_STORAGE"])
+        ) if on),
+        PHOTOS_DIR_STR=photos_dir,
+        CHROMA_DB_DIR_STR=chroma_db_dir,
+        STATIC_DIR_STR=static_dir,
+        TEMP_UPLOAD_DIR_STR=temp_upload_dir,
+        **values,
+    ))
 
-    # ========== 前端配置 ==========
-    # 获取前端URL，用于CORS
-    FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 
-    # ========== 云存储配置 ==========
-    # 如果使用云存储，可以配置S3等
-    USE_CLOUD_STORAGE = os.getenv("USE_CLOUD_STORAGE", "false").lower() == "true"
-    CLOUD_STORAGE_BUCKET = os.getenv("CLOUD_STORAGE_BUCKET", "")
+def share_config():
+    """把已解析的配置写入共享内存，之后启动的子进程导入本模块时直接读取
 
-    # ========== 临时文件配置 ==========
-    TEMP_UPLOAD_DIR = DATA_DIR / "temp_uploads"
-    TEMP_UPLOAD_DIR.mkdir(exist_ok=True)
+    需要在创建进程池之前调用；共享内存在父进程退出时释放。
+    """
+    if _SHM_ENV in os.environ:
+        return
+    from multiprocessing import shared_memory
+    payload = pickle.dumps(config._asdict())
+    shm = shared_memory.SharedMemory(create=True, size=len(payload))
+    shm.buf[:len(payload)] = payload
+    os.environ[_SHM_ENV] = f"{shm.name}:{len(payload)}"
+
+    def _release():
+        shm.close()
+        shm.unlink()
+
+    atexit.register(_release)
 
 
 # 全局配置实例
-config = Config()
\ No newline at end of file
+config = get_config()
+
+# ========== 前端配置 ==========
+# 页面展示用的静态文案单独放在 WEB 中，保持 config 只包含运行参数
+WEB = SimpleNamespace(
+    title="AI智能选片助手",
+    description="自动检测照片质量，支持语义搜索",
+    icon_css="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css",  # 图标库CSS（原 WEB_FAVICON）
+    url=config.FRONTEND_URL,
+)
+
+# 启动后不再变化的配置，作为模块级常量导出（from config import BATCH_SIZE）
+BATCH_SIZE: Final[int] = config.BATCH_SIZE
+MAX_WORKERS: Final[int] = config.MAX_WORKERS
+SEARCH_BATCH_SIZE: Final[int] = config.SEARCH_BATCH_SIZE
+IMAGE_CACHE_SIZE: Final[int] = config.IMAGE_CACHE_SIZE
+BLUR_THRESHOLD: Final[float] = config.BLUR_THRESHOLD
+OVEREXPOSURE_THRESHOLD: Final[float] = config.OVEREXPOSURE_THRESHOLD
+UNDEREXPOSURE_THRESHOLD: Final[float] = config.UNDEREXPOSURE_THRESHOLD
+MAX_IMAGE_SIZE: Final[int] = config.MAX_IMAGE_SIZE
+RESIZE_SCALE: Final[float] = config.RESIZE_SCALE
+SIMILARITY_THRESHOLD: Final[float] = config.SIMILARITY_THRESHOLD
+VECTOR_SQ8: Final[bool] = config.VECTOR_SQ8
+CLIP_MODEL_NAME: Final[str] = config.CLIP_MODEL_NAME
+USE_GPU: Final[bool] = config.USE_GPU
+USE_BF16: Final[bool] = config.USE_BF16
+USE_CLOUD_STORAGE: Final[bool] = config.USE_CLOUD_STORAGE
+FEATURES: Final[frozenset] = config.FEATURES
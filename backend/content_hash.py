@@ -0,0 +1,27 @@
+# content_hash.py - 照片内容哈希（向量库中的照片ID）
+# 只依赖 xxhash：质量检测子进程和语义搜索进程都从这里导入，互不加载对方的依赖
+import xxhash
+
+# 照片内容哈希算法（作为向量库中的照片ID，更换算法时向量库会重建）
+CONTENT_HASH = "xxh3_128"
+
+
+def buffer_hash(data):
+    """计算内存中文件内容（bytes、mmap等支持缓冲区协议的对象）的照片ID，与 file_hash 结果一致"""
+    return xxhash.xxh3_128(data).hexdigest()
+
+
+def file_hash(path):
+    """计算文件内容的xxh3-128哈希（作为照片ID），读取失败时返回None
+
+    xxh3 是SIMD实现的非加密哈希，只用于去重，速度比MD5快一个数量级
+    """
+    try:
+        with open(path, "rb") as f:
+            h = xxhash.xxh3_128()
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+            return h.hexdigest()
+    except OSError as e:
+        print(f"❌ 读取文件失败 {path}: {e}")
+        return None
@@ -0,0 +1,116 @@
+import threading
+import multiprocessing
+
+
+def _serve(search, conn):
+    """在工作进程中依次处理一条管道上的调用请求，直到主进程关闭管道"""
+    while True:
+        try:
+            method, args, kwargs = conn.recv()
+        except (EOFError, OSError):
+            break
+        try:
+            reply = (True, getattr(search, method)(*args, **kwargs))
+        except Exception as e:
+            # 异常对象不一定能pickle，只传回描述
+            reply = (False, f"{type(e).__name__}: {e}")
+        conn.send(reply)
+
+
+def embed_worker(index_conn, query_conn):
+    """语义搜索工作进程入口：CLIP模型和向量数据库只在这里加载
+
+    索引和查询各用一条管道、一个线程处理，批量索引不会阻塞搜索请求
+    """
+    from semantic_search import PhotoSemanticSearch
+
+    search = PhotoSemanticSearch()
+    index_conn.send({"input_resolution": search.input_resolution})
+
+    threading.Thread(target=_serve, args=(search, query_conn), name="query", daemon=True).start()
+    _serve(search, index_conn)
+    # 主进程关闭管道（服务退出）后写回向量库中尚未保存的修改
+    search.flush_index()
+
+
+class SemanticSearchClient:
+    """PhotoSemanticSearch 的进程代理，方法与之相同
+
+    搜索类调用走查询管道，其余（索引、哈希、清空等）走索引管道；
+    每条管道同一时间只允许一个调用，由各自的锁保证
+    """
+    QUERY_METHODS = frozenset({"search_photos", "search_photos_batch", "get_text_embedding", "get_collection_stats"})
+
+    def __init__(self):
+        self._process = None
+        self._index_conn = None
+        self._query_conn = None
+        self._index_lock = threading.Lock()
+        self._query_lock = threading.Lock()
+        self._ready_lock = threading.Lock()
+        self._info = None
+
+    def start(self):
+        """启动工作进程（在 share_config 之后调用，子进程通过共享内存读取配置）"""
+        if self._process is not None:
+            return
+        ctx = multiprocessing.get_context("spawn")
+        self._index_conn, index_child = ctx.Pipe()
+        self._query_conn, query_child = ctx.Pipe()
+        self._process = ctx.Process(
+            target=embed_worker, args=(index_child, query_child), name="embedder", daemon=True
+        )
+        self._process.start()
+        index_child.close()
+        query_child.close()
+        print(f"✅ 语义搜索进程已启动 (pid={self._process.pid})")
+
+    def stop(self):
+        """关闭管道并结束工作进程"""
+        if self._process is None:
+            return
+        self._index_conn.close()
+        self._query_conn.close()
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process = None
+
+    def _ready(self):
+        """等待工作进程加载完模型，返回其上报的模型信息
+
+        就绪消息从索引管道读取；读到之前不会发出任何调用，所以不会和索引调用抢同一条管道
+        """
+        if self._info is not None:
+            return self._info
+        with self._ready_lock:
+            if self._info is None:
+                self.start()
+                try:
+                    self._info = self._index_conn.recv()
+                except EOFError:
+                    raise RuntimeError("语义搜索进程启动失败")
+        return self._info
+
+    @property
+    def input_resolution(self):
+        return self._ready()["input_resolution"]
+
+    def _call(self, method, *args, **kwargs):
+        self._ready()
+        query = method in self.QUERY_METHODS
+        conn = self._query_conn if query else self._index_conn
+        with self._query_lock if query else self._index_lock:
+            try:
+                conn.send((method, args, kwargs))
+                ok, result = conn.recv()
+            except (EOFError, OSError):
+                raise RuntimeError(f"语义搜索进程已退出，无法调用 {method}")
+        if not ok:
+            raise RuntimeError(f"语义搜索进程调用 {method} 失败: {result}")
+        return result
+
+    def __getattr__(self, method):
+        if method.startswith("_"):
+            raise AttributeError(method)
+        return lambda *args, **kwargs: self._call(method, *args, **kwargs)
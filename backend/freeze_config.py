@@ -0,0 +1,47 @@
+# freeze_config.py - 构建时固化配置
+"""在构建阶段解析一次配置并生成 config_frozen.py
+
+部署时在构建命令中执行 `python freeze_config.py`，
+运行时设置环境变量 FROZEN_CONFIG=1 即可直接加载生成的常量。
+生成的模块同时预编译为不校验源文件的 .pyc，导入时无需解析源码。
+"""
+import os
+import py_compile
+from pathlib import Path
+
+# 固化时必须从环境变量重新解析，而不是读取旧的生成结果
+os.environ.pop("FROZEN_CONFIG", None)
+
+from config import config, RUNTIME_FIELDS
+
+OUTPUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config_frozen.py")
+
+
+def main():
+    lines = [
+        "# config_frozen.py - 由 freeze_config.py 自动生成，请勿手动修改",
+        "from pathlib import Path",
+        "",
+    ]
+    for name, value in config._asdict().items():
+        if name in RUNTIME_FIELDS:
+            continue
+        if isinstance(value, Path):
+            lines.append(f"{name} = Path({str(value)!r})")
+        else:
+            lines.append(f"{name} = {value!r}")
+
+    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+    # 每次生成都重新编译：UNCHECKED_HASH 的 .pyc 在导入时不会再与源文件比对
+    py_compile.compile(
+        OUTPUT_PATH,
+        doraise=True,
+        invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+    )
+    print(f"✅ 已生成 {OUTPUT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@
 class PhotoAssistantApp {
     constructor() {
         this.apiBaseUrl = this.detectApiUrl();
-        this.photos = [];
+        this.photos = null;  // 按列存储的照片结果，见 photoAt()
         this.selectedFiles = [];
         this.currentTaskId = null;
         this.progressInterval = null;
@@ -364,15 +364,30 @@ class PhotoAssistantApp {
 
         document.getElementById('resultStats').innerHTML = statsHtml;
 
-        // 显示照片
-        this.photos = result.photos || [];
+        // 显示照片（后端按列返回：image_paths / filenames / is_defective / defect_types 按下标对齐）
+        this.photos = result.photos || null;
         this.renderPhotos();
     }
 
+    photoCount() {
+        return this.photos ? this.photos.image_paths.length : 0;
+    }
+
+    photoAt(index) {
+        const columns = this.photos;
+        return {
+            image_path: columns.image_paths[index],
+            filename: columns.filenames[index],
+            is_defective: columns.is_defective[index],
+            defect_types: columns.defect_types[index]
+        };
+    }
+
     renderPhotos() {
         const photoGrid = document.getElementById('photoGrid');
+        const count = this.photoCount();
 
-        if (this.photos.length === 0) {
+        if (count === 0) {
             photoGrid.innerHTML = `
                 <div class="empty-state">
                     <i class="fas fa-images fa-3x"></i>
@@ -384,10 +399,10 @@ class PhotoAssistantApp {
 
         photoGrid.innerHTML = '';
 
-        this.photos.forEach(photo => {
-            const photoItem = this.createPhotoElement(photo);
+        for (let i = 0; i < count; i++) {
+            const photoItem = this.createPhotoElement(this.photoAt(i));
             photoGrid.appendChild(photoItem);
-        });
+        }
     }
 
     createPhotoElement(photo) {
@@ -561,18 +576,31 @@ class PhotoAssistantApp {
         try {
             const response = await fetch(`${this.apiBaseUrl}/search_photos`, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Accept': 'application/x-ndjson'
+                },
                 body: JSON.stringify({
                     query: query,
                     top_k: 10
                 })
             });
 
-            const result = await response.json();
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
 
-            if (result.results && result.results.length > 0) {
-                this.displaySearchResults(result.results);
-            } else {
+            // 结果按NDJSON逐行返回，每收到一条就追加显示，不等待整个响应
+            let list = null;
+            for await (const result of this.readNdjson(response)) {
+                if (!list) {
+                    searchResults.innerHTML = '<div class="search-results-list"></div>';
+                    list = searchResults.firstElementChild;
+                }
+                list.appendChild(this.createSearchResultElement(result));
+            }
+
+            if (!list) {
                 searchResults.innerHTML = `
                     <div class="empty-state">
                         <i class="fas fa-search fa-3x"></i>
@@ -594,57 +622,56 @@ class PhotoAssistantApp {
         }
     }
 
-    displaySearchResults(results) {
-        const searchResults = document.getElementById('searchResults');
-
-        if (results.length === 0) {
-            searchResults.innerHTML = `
-                <div class="empty-state">
-                    <i class="fas fa-search fa-3x"></i>
-                    <p>没有找到相关照片</p>
-                </div>
-            `;
-            return;
+    async *readNdjson(response) {
+        // 逐块解码响应体，按换行切分，每得到完整一行就解析并产出
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += value;
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            for (const line of lines) {
+                if (line.trim()) yield JSON.parse(line);
+            }
         }
+        if (buffer.trim()) yield JSON.parse(buffer);
+    }
 
-        let html = '<div class="search-results-list">';
-
-        results.forEach(result => {
-            const imageUrl = `${this.apiBaseUrl}/get_photo/${encodeURIComponent(result.path)}`;
-            const similarityPercent = Math.round(result.similarity_score * 100);
-
-            html += `
-                <div class="search-result">
-                    <img src="${imageUrl}" alt="${result.filename}" class="result-image"
-                         onerror="this.src='data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iODAiIGhlaWdodD0iODAiIHZpZXdCb3g9IjAgMCA4MCA4MCIgZmlsbD0iI2YwZjBmMCI+PHJlY3Qgd2lkdGg9IjgwIiBoZWlnaHQ9IjgwIi8+PHRleHQgeD0iNDAiIHk9IjQwIiBmb250LWZhbWlseT0iQXJpYWwiIGZvbnQtc2l6ZT0iMTIiIGZpbGw9IiNhYWEiIHRleHQtYW5jaG9yPSJtaWRkbGUiIGR5PSIuM2VtIj4mbmJzcDs8L3RleHQ+PC9zdmc+'">
-                    <div class="result-info">
-                        <h4>${result.filename}</h4>
-                        <p>相似度: <span class="result-score">${similarityPercent}%</span></p>
-                        <button class="btn btn-small view-photo-btn" data-path="${result.path}">
-                            <i class="fas fa-eye"></i> 查看
-                        </button>
-                    </div>
+    createSearchResultElement(result) {
+        const imageUrl = `${this.apiBaseUrl}/get_photo/${encodeURIComponent(result.path)}`;
+        const similarityPercent = Math.round(result.similarity_score * 100);
+
+        const template = document.createElement('template');
+        template.innerHTML = `
+            <div class="search-result">
+                <img src="${imageUrl}" alt="${result.filename}" class="result-image"
+                     onerror="this.src='data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iODAiIGhlaWdodD0iODAiIHZpZXdCb3g9IjAgMCA4MCA4MCIgZmlsbD0iI2YwZjBmMCI+PHJlY3Qgd2lkdGg9IjgwIiBoZWlnaHQ9IjgwIi8+PHRleHQgeD0iNDAiIHk9IjQwIiBmb250LWZhbWlseT0iQXJpYWwiIGZvbnQtc2l6ZT0iMTIiIGZpbGw9IiNhYWEiIHRleHQtYW5jaG9yPSJtaWRkbGUiIGR5PSIuM2VtIj4mbmJzcDs8L3RleHQ+PC9zdmc+'">
+                <div class="result-info">
+                    <h4>${result.filename}</h4>
+                    <p>相似度: <span class="result-score">${similarityPercent}%</span></p>
+                    <button class="btn btn-small view-photo-btn" data-path="${result.path}">
+                        <i class="fas fa-eye"></i> 查看
+                    </button>
                 </div>
-            `;
-        });
-
-        html += '</div>';
-        searchResults.innerHTML = html;
+            </div>
+        `.trim();
+        const div = template.content.firstElementChild;
 
         // 绑定查看按钮事件
-        document.querySelectorAll('.view-photo-btn').forEach(btn => {
-            btn.addEventListener('click', (e) => {
-                const path = e.target.dataset.path || e.target.closest('.view-photo-btn').dataset.path;
-                this.viewPhoto(path);
-            });
+        div.querySelector('.view-photo-btn').addEventListener('click', () => {
+            this.viewPhoto(result.path);
         });
+
+        return div;
     }
 
     viewPhoto(path) {
         // 查找对应的照片数据
-        const photo = this.photos.find(p => p.image_path === path);
-        if (photo) {
-            this.previewPhoto(photo);
+        const index = this.photos ? this.photos.image_paths.indexOf(path) : -1;
+        if (index !== -1) {
+            this.previewPhoto(this.photoAt(index));
         } else {
             // 如果不在当前列表，直接预览
             this.previewPhoto({
@@ -697,7 +724,7 @@ class PhotoAssistantApp {
 
             // 重置数据
             this.selectedFiles = [];
-            this.photos = [];
+            this.photos = null;
             this.currentTaskId = null;
             this.currentUploadId = null;
 
@@ -0,0 +1,72 @@
+# image_decode.py - 质量检测与CLIP索引共用的图像解码和缩略图预处理
+# 两条路径使用同一套解码倍数和缩放方式，同一张照片无论是否命中质量检测缓存都得到相同的CLIP输入
+import cv2
+import numpy as np
+from PIL import Image
+
+from config import MAX_IMAGE_SIZE, RESIZE_SCALE
+
+# 解码时的缩小倍数 -> (灰度读取flag, 彩色读取flag)
+# JPEG在DCT域直接按1/2、1/4、1/8缩小（libjpeg-turbo省去大部分IDCT计算），其它格式解码后由OpenCV缩小
+REDUCED_FLAGS = {
+    1: (cv2.IMREAD_GRAYSCALE, cv2.IMREAD_COLOR),
+    2: (cv2.IMREAD_REDUCED_GRAYSCALE_2, cv2.IMREAD_REDUCED_COLOR_2),
+    4: (cv2.IMREAD_REDUCED_GRAYSCALE_4, cv2.IMREAD_REDUCED_COLOR_4),
+    8: (cv2.IMREAD_REDUCED_GRAYSCALE_8, cv2.IMREAD_REDUCED_COLOR_8),
+}
+
+
+def reduce_factor(image_path, min_side=1, buf=None, resize_scale=RESIZE_SCALE, max_image_size=MAX_IMAGE_SIZE):
+    """根据文件头中的尺寸（不解码像素）选择解码时的缩小倍数
+
+    Args:
+        image_path: 照片路径
+        min_side: 解码结果短边的最小长度（如CLIP输入尺寸）
+        buf: 可选，已映射到内存的文件内容（见 photo_quality_checker.map_file），传入时从中读取文件头
+        resize_scale, max_image_size: 超过 max_image_size 像素的图按 resize_scale 缩小做质量检测
+
+    Returns:
+        (缩小倍数, 灰度图还需的缩放比例)；读不到文件头时为 (1, None)，由调用方按解码后的尺寸处理
+    """
+    try:
+        if buf is not None:
+            buf.seek(0)
+        with Image.open(image_path if buf is None else buf) as im:
+            w, h = im.size
+    except Exception:
+        return 1, None
+
+    scale = resize_scale if w * h > max_image_size else 1.0
+    for factor in (8, 4, 2):
+        if factor * scale <= 1 and min(w, h) // factor >= min_side:
+            return factor, scale * factor
+    return 1, scale
+
+
+def imread(image_path, flag, buf=None):
+    """读取图像；传入已映射的文件内容时直接在内存中解码，不再读一遍文件"""
+    if buf is None:
+        return cv2.imread(image_path, flag)
+    return cv2.imdecode(np.frombuffer(buf, np.uint8), flag)
+
+
+def clip_thumbnail(img_bgr, size):
+    """按CLIP预处理的方式把短边缩放到 size 并居中裁剪，返回 size×size 的RGB uint8数组"""
+    h, w = img_bgr.shape[:2]
+    scale = size / min(h, w)
+    new_w, new_h = max(size, round(w * scale)), max(size, round(h * scale))
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    resized = cv2.resize(img_bgr, (new_w, new_h), interpolation=interpolation)
+
+    top, left = (new_h - size) // 2, (new_w - size) // 2
+    cropped = resized[top:top + size, left:left + size]
+    return cv2.cvtColor(cropped, cv2.COLOR_BGR2RGB)
+
+
+def load_clip_thumbnail(image_path, size, buf=None):
+    """从磁盘读取照片并生成CLIP缩略图，解码倍数与质量检测阶段（check_photo_quality_decoded）一致，读取失败时返回None"""
+    factor, _ = reduce_factor(image_path, min_side=size, buf=buf)
+    img = imread(image_path, REDUCED_FLAGS[factor][1], buf)
+    if img is None:
+        return None
+    return clip_thumbnail(img, size)
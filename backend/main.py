@@ -1,60 +1,64 @@
 import os
-import glob
 import time
-import json
-import numpy as np
-from typing import Dict, List, Any
-from concurrent.futures import ThreadPoolExecutor, as_completed
-
-from fastapi import FastAPI, HTTPException, Query, BackgroundTasks
+import asyncio
+import atexit
+import queue
+import threading
+import mimetypes
+from urllib.parse import quote
+from functools import partial
+from array import array
+import orjson
+from typing import Dict, List, Optional, Set, Tuple
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import FastAPI, HTTPException, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse, HTMLResponse
+from fastapi.responses import FileResponse, JSONResponse, HTMLResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
-from config import config
-from photo_quality_checker import PhotoQualityChecker
-from semantic_search import PhotoSemanticSearch
+from config import config, share_config, BATCH_SIZE
+from photo_quality_checker import PhotoQualityChecker, QualityCache, init_worker_checker, check_photo_in_worker
+from content_hash import file_hash
+from embedding_worker import SemanticSearchClient
 import uuid
 import shutil
+import aiofiles
 from fastapi import UploadFile, File
 
-class NumpyEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, (np.bool_, np.bool)):
-            return bool(obj)
-        elif isinstance(obj, np.integer):
-            return int(obj)
-        elif isinstance(obj, np.floating):
-            return float(obj)
-        elif isinstance(obj, np.ndarray):
-            return obj.tolist()
-        else:
-            return super().default(obj)
-
-
-def serialize_for_json(obj: Any) -> Any:
-    if isinstance(obj, (np.bool_, np.bool)):
-        return bool(obj)
-    elif isinstance(obj, np.integer):
-        return int(obj)
-    elif isinstance(obj, np.floating):
-        return float(obj)
-    elif isinstance(obj, np.ndarray):
-        return obj.tolist()
-    elif isinstance(obj, dict):
-        return {key: serialize_for_json(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [serialize_for_json(item) for item in obj]
-    else:
-        return obj
+# 质量检测→语义索引流水线：队列容量，以及凑不满一批时最长等待秒数
+# 队列中每项附带约150KB的CLIP缩略图，容量决定了这部分内存的上限
+INDEX_QUEUE_SIZE = 1024
+INDEX_FLUSH_INTERVAL = 2.0
+# 队列已满时每隔多少秒检查一次消费者是否还在运行
+INDEX_PUT_TIMEOUT = 1.0
+# 任务进度最短更新间隔（秒），前端每2秒才轮询一次
+PROGRESS_INTERVAL = 0.25
+# 默认线程池（run_in_executor(None, ...)）的线程数，用于搜索、上传等短请求
+REQUEST_THREADS = 8
+
+# 扫描文件夹时识别的图片类型（与小写文件名比较，大小写不敏感）
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+# 批量搜索一次最多接受的查询数
+MAX_BATCH_QUERIES = 64
+
+# 照片响应的浏览器缓存时间（秒）
+PHOTO_CACHE_CONTROL = "public, max-age=86400"
 
+# 允许上传的图片类型及上传时每次读写的块大小（1 MiB）
+UPLOAD_EXTENSIONS = (".jpg", ".jpeg", ".png")
+UPLOAD_CHUNK_SIZE = 1 << 20
 
 # 初始化应用
 app = FastAPI(
     title="AI Photo Assistant API",
     description="AI智能选片助手后端API",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse
 )
 
 
@@ -70,16 +74,20 @@ async def upload_photos(files: List[UploadFile] = File(...)):
         uploaded_files = []
         for file in files:
             # 验证文件类型
-            if not file.filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+            if not file.filename.lower().endswith(UPLOAD_EXTENSIONS):
                 continue
 
-            # 保存文件
+            # 分块写入磁盘，避免整张照片读入内存
             file_path = upload_dir / file.filename
-            with open(file_path, "wb") as buffer:
-                content = await file.read()
-                buffer.write(content)
+            async with aiofiles.open(file_path, "wb") as buffer:
+                while True:
+                    chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    await buffer.write(chunk)
 
             uploaded_files.append(str(file_path))
+            register_photos([file.filename], [str(file_path)])
 
         if not uploaded_files:
             return {"status": "error", "message": "没有有效的图片文件"}
@@ -97,19 +105,24 @@ async def upload_photos(files: List[UploadFile] = File(...)):
 
 
 @app.get("/clear_cache")
-async def clear_cache():
-    """清理缓存和临时文件"""
+def clear_cache():
+    """清理缓存和临时文件
+
+    普通函数由FastAPI放到线程池执行：清空向量库要等待语义搜索进程的索引管道（可能正在索引大批照片），
+    不能阻塞事件循环
+    """
     try:
         # 清理处理任务
         processing_tasks.clear()
 
         # 清理临时上传目录
-        if os.path.exists(config.TEMP_UPLOAD_DIR):
-            shutil.rmtree(config.TEMP_UPLOAD_DIR, ignore_errors=True)
+        if os.path.exists(config.TEMP_UPLOAD_DIR_STR):
+            shutil.rmtree(config.TEMP_UPLOAD_DIR_STR, ignore_errors=True)
             config.TEMP_UPLOAD_DIR.mkdir(exist_ok=True)
 
         # 清理质量检查器缓存
         quality_checker.clear_cache()
+        QUALITY_CACHE.clear()
 
         # 清空语义搜索索引
         semantic_search.clear_collection()
@@ -117,6 +130,8 @@ async def clear_cache():
         # 清空内存数据
         processed_photos.clear()
         QUALIFIED_PHOTOS.clear()
+        PHOTO_INDEX.clear()
+        _scan_cache.clear()
 
         return {"status": "success", "message": "缓存已清理"}
     except Exception as e:
@@ -130,11 +145,58 @@ app.add_middleware(
 )
 
 quality_checker = PhotoQualityChecker()
-semantic_search = PhotoSemanticSearch()
+QUALITY_CACHE = QualityCache(quality_checker)
+atexit.register(QUALITY_CACHE.close)
+# 质量检测进程池：每个子进程有独立的解释器和检测器，绕开GIL；整个服务复用，避免重复创建进程。
+# 用 spawn 启动，子进程只导入 photo_quality_checker，不会加载CLIP模型
+def new_quality_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=config.MAX_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker_checker
+    )
+
+
+QUALITY_POOL = new_quality_pool()
+# 子进程崩溃（损坏或超大图片导致段错误、内存不足）后进程池不可再用，由 run_quality_checks 重建
+_quality_pool_lock = threading.Lock()
+
+
+def shutdown_quality_pool():
+    QUALITY_POOL.shutdown()
+
+
+atexit.register(shutdown_quality_pool)
+
+# 整个文件夹的处理（同步 /process_photos 和后台任务）可持续数分钟，在单独的线程池中执行，
+# 不占用默认线程池中搜索、上传等短请求的线程；退出时不等待未完成的处理任务
+PROCESSING_POOL = ThreadPoolExecutor(max_workers=config.MAX_WORKERS, thread_name_prefix="processing")
+atexit.register(partial(PROCESSING_POOL.shutdown, wait=False, cancel_futures=True))
+
+# 计算文件哈希等IO密集任务用的线程池（读文件和 xxhash 计算时会释放GIL）
+IO_POOL = ThreadPoolExecutor(max_workers=config.MAX_WORKERS, thread_name_prefix="io")
+atexit.register(IO_POOL.shutdown)
+# CLIP模型和向量数据库在独立进程中加载，启动时拉起（见 startup）
+semantic_search = SemanticSearchClient()
+atexit.register(semantic_search.stop)
 
 processed_photos = {}
-QUALIFIED_PHOTOS = []
+# 合格照片集合（O(1) 成员判断），原地更新以便其他模块持有的引用保持有效
+QUALIFIED_PHOTOS: Set[str] = set()
 processing_tasks: Dict[str, Dict] = {}
+# 文件名 -> 照片路径，扫描文件夹和上传时登记（见 register_photos）；/get_photo 原路径不存在时按文件名查找，
+# 不再遍历目录。不同文件夹中的同名照片无法按文件名区分，值记为None，不再用于查找；最多保留 PHOTO_INDEX_SIZE 项
+PHOTO_INDEX_SIZE = 100000
+PHOTO_INDEX: Dict[str, Optional[str]] = {}
+
+
+def register_photos(filenames: List[str], paths: List[str]):
+    for filename, path in zip(filenames, paths):
+        known = PHOTO_INDEX.pop(filename, path)
+        # 重新插入到末尾，淘汰时先淘汰最久未登记的文件名
+        PHOTO_INDEX[filename] = path if known == path else None
+    while len(PHOTO_INDEX) > PHOTO_INDEX_SIZE:
+        del PHOTO_INDEX[next(iter(PHOTO_INDEX))]
 
 
 class FolderRequest(BaseModel):
@@ -146,34 +208,239 @@ class SearchQuery(BaseModel):
     top_k: int = 10
 
 
-def get_image_files(folder_path: str) -> List[str]:
-    image_extensions = [".jpg", ".jpeg", ".png", ".bmp", ".JPG", ".JPEG", ".PNG", ".BMP"]
-    photo_paths = []
+class BatchSearchQuery(BaseModel):
+    queries: List[str]
+    top_k: int = 10
+
+
+# 文件夹扫描缓存: folder_path -> (文件夹mtime, 排序后的图片路径, 文件名)，最多保留 SCAN_CACHE_SIZE 个文件夹
+SCAN_CACHE_SIZE = 32
+_scan_cache: Dict[str, tuple] = {}
+
+
+def get_image_files(folder_path: str) -> Tuple[List[str], List[str]]:
+    """单次 os.scandir 扫描文件夹中的图片，返回按路径排序、下标对齐的 (路径列表, 文件名列表)
+
+    文件名直接取自目录项，后续不再逐张调用 os.path.basename；文件夹未变化时直接返回缓存结果
+    """
+    try:
+        mtime = os.stat(folder_path).st_mtime_ns
+        cached = _scan_cache.get(folder_path)
+        if cached and cached[0] == mtime:
+            return list(cached[1]), list(cached[2])
+
+        with os.scandir(folder_path) as entries:
+            found = sorted((e.path, e.name) for e in entries if e.is_file() and e.name.lower().endswith(IMAGE_EXTENSIONS))
+    except OSError as e:
+        # 路径不是文件夹或无权读取时按没有图片处理
+        print(f"⚠️  无法读取文件夹 {folder_path}: {e}")
+        return [], []
+    photo_paths = [path for path, _ in found]
+    filenames = [name for _, name in found]
+
+    _scan_cache.pop(folder_path, None)
+    if len(_scan_cache) >= SCAN_CACHE_SIZE:
+        # 淘汰最早扫描的文件夹（字典保持插入顺序）
+        del _scan_cache[next(iter(_scan_cache))]
+    _scan_cache[folder_path] = (mtime, photo_paths, filenames)
+    register_photos(filenames, photo_paths)
+    return list(photo_paths), list(filenames)
+
+
+def run_quality_checks(check, paths: List[str], chunksize: int) -> List[dict]:
+    """在质量检测进程池中检测一批照片；进程池损坏时重建并重试一次，仍失败则整批按检测失败返回
+
+    检测失败的照片与单张检测出错时相同，不判为废片，结果不含检测指标（不会写入质量缓存）
+    """
+    global QUALITY_POOL
+    for _ in range(2):
+        pool = QUALITY_POOL
+        try:
+            return list(pool.map(check, paths, chunksize=chunksize))
+        except BrokenProcessPool:
+            with _quality_pool_lock:
+                # 其他线程可能已经重建过
+                if QUALITY_POOL is pool:
+                    print("⚠️  质量检测子进程异常退出，重建进程池")
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    QUALITY_POOL = new_quality_pool()
+
+    print(f"❌ 质量检测进程池连续损坏，本批 {len(paths)} 张照片按检测失败处理")
+    return [
+        {"image_path": path, "is_defective": False, "defect_types": [], "details": {}}
+        for path in paths
+    ]
+
+
+def process_batch_photos(batch_paths: List[str], with_thumbnails: bool = False) -> List[dict]:
+    """在进程池中并行检测一批照片，结果顺序与输入一致
+
+    with_thumbnails 为真且CLIP可用时，合格照片的结果附带 "thumbnail"（解码一次，供语义索引直接使用）
+    """
+    embed_size = semantic_search.input_resolution if with_thumbnails else None
+    # 先查持久化缓存，mtime 和大小未变化的照片不再解码；命中的结果不带缩略图，
+    # 尚未索引时由语义索引从原图读取
+    lookups = QUALITY_CACHE.lookup(batch_paths, embed_size)
+    results = [cached for _, cached in lookups]
+    misses = [i for i, cached in enumerate(results) if cached is None]
+    if not misses:
+        return results
+
+    chunksize = max(1, len(misses) // (config.MAX_WORKERS * 4))
+    check = partial(check_photo_in_worker, embed_size=embed_size)
+    miss_paths = [batch_paths[i] for i in misses]
+    for i, result in zip(misses, run_quality_checks(check, miss_paths, chunksize)):
+        results[i] = result
+    QUALITY_CACHE.store([(batch_paths[i], lookups[i][0], results[i]) for i in misses], embed_size)
+    return results
+
+
+def photo_columns(paths: List[str], filenames: List[str], defective: array, defect_types: List[list]) -> dict:
+    """按列组织照片结果（各列按照片下标对齐），避免逐张构造字典，序列化也更快"""
+    return {
+        "image_paths": paths,
+        "filenames": filenames,
+        "is_defective": list(map(bool, defective)),
+        "defect_types": defect_types
+    }
+
 
-    for ext in image_extensions:
-        files = glob.glob(os.path.join(folder_path, f"*{ext}"), recursive=False)
-        photo_paths.extend(files)
+def update_pipeline_progress(task_id: str, state: dict, force: bool = False):
+    """按质量检测和语义索引两个阶段的总进度更新任务状态
 
-    photo_paths = list(set(photo_paths))
-    photo_paths.sort()
-    return photo_paths
+    最多每 PROGRESS_INTERVAL 秒写一次（force 时除外），进度消息只在百分比变化时重新生成
+    """
+    now = time.monotonic()
+    if not force and now - state["last_update"] < PROGRESS_INTERVAL:
+        return
+    state["last_update"] = now
+
+    total = state["total"]
+    # 每张照片先检测后索引各算一步；废片不进入索引，检测完即算两步都已完成
+    done = min(state["checked"] + state["index_done"] + state["skipped"], 2 * total)
+    progress = int(done / (2 * total) * 100)
+
+    task = processing_tasks.get(task_id)
+    if task is None:
+        # 任务已被 /clear_cache 清除
+        return
+    task["status"] = "processing"
+    task["current"] = state["checked"]
+    if task.get("progress") != progress:
+        task["progress"] = progress
+        task["message"] = f"已检测 {state['checked']}/{total} 张照片，已索引 {state['index_done']} 张..."
+
+
+def index_new_photos(photo_paths: List[str], known_hashes: Dict[str, str], images: List = None,
+                     hashes: List = None) -> int:
+    """增量索引：按内容哈希跳过已索引照片，移动过的照片只更新路径
+
+    Args:
+        images: 可选，与 photo_paths 对应的CLIP缩略图，避免重新解码原图
+        hashes: 可选，与 photo_paths 对应的内容哈希（质量检测时已算好），为None的照片在这里读文件计算
+
+    Returns:
+        本批次中已在索引内的照片数量（新索引 + 已存在）
+    """
+    if hashes is None:
+        hashes = [None] * len(photo_paths)
+    missing = [i for i, photo_hash in enumerate(hashes) if photo_hash is None]
+    if missing:
+        hashes = list(hashes)
+        for i, photo_hash in zip(missing, IO_POOL.map(file_hash, [photo_paths[i] for i in missing])):
+            hashes[i] = photo_hash
+    if images is None:
+        images = [None] * len(photo_paths)
+
+    new_paths, new_hashes, new_images, moved = [], [], [], {}
+    existing = 0
+    for path, photo_hash, image in zip(photo_paths, hashes, images):
+        if photo_hash is None:
+            continue
+        known_path = known_hashes.get(photo_hash)
+        if known_path is None:
+            new_paths.append(path)
+            new_hashes.append(photo_hash)
+            new_images.append(image)
+            continue
+        existing += 1
+        if known_path != path:
+            moved[photo_hash] = path
+
+    if moved:
+        semantic_search.update_photo_paths(moved)
+        known_hashes.update(moved)
+
+    indexed = semantic_search.index_photos(new_paths, hashes=new_hashes, images=new_images) if new_paths else 0
+    known_hashes.update(zip(new_hashes, new_paths))
+    print(f"增量索引: 新增 {indexed} 张，已存在 {existing} 张（路径更新 {len(moved)} 张）")
+    return existing + indexed
+
+
+def put_index_item(index_queue: queue.Queue, item, consumer: threading.Thread) -> bool:
+    """放入索引队列，队列满时等待；消费者线程已退出时不再等待，返回 False"""
+    while True:
+        try:
+            index_queue.put(item, timeout=INDEX_PUT_TIMEOUT)
+            return True
+        except queue.Full:
+            if not consumer.is_alive():
+                return False
 
 
-def process_batch_photos(batch_paths: List[str]) -> List[dict]:
-    batch_results = []
-    for path in batch_paths:
+def index_consumer(task_id: str, index_queue: queue.Queue, state: dict):
+    """语义索引消费者：攒够一批 (路径, 缩略图, 内容哈希)（或等待超时）就建立索引，收到 None 时结束"""
+    # 每批凑满自动调优得到的批大小，让嵌入后端跑满；调优失败（如工作进程内存不足退出）时不能让消费者退出，
+    # 否则生产者会阻塞在已满的队列上
+    try:
+        batch_limit = semantic_search.tune_batch_size()
+    except Exception as e:
+        print(f"索引批大小调优失败，使用默认批大小 {BATCH_SIZE}: {e}")
+        batch_limit = BATCH_SIZE
+    try:
+        known_hashes = semantic_search.get_indexed_hashes()
+    except Exception as e:
+        print(f"读取已有索引失败，将全部重新索引: {e}")
+        known_hashes = {}
+    finished = False
+
+    while not finished:
+        batch = []
+        deadline = time.monotonic() + INDEX_FLUSH_INTERVAL
+        while len(batch) < batch_limit:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = index_queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                finished = True
+                break
+            batch.append(item)
+
+        if not batch:
+            continue
+
+        # 单批失败不能让消费者退出，否则生产者会阻塞在已满的队列上
         try:
-            result = quality_checker.check_photo_quality(path)
-            batch_results.append(result)
+            batch_paths, batch_images, batch_hashes = zip(*batch)
+            state["indexed"] += index_new_photos(
+                list(batch_paths), known_hashes, list(batch_images), list(batch_hashes)
+            )
         except Exception as e:
-            print(f"处理失败 {path}: {e}")
-            batch_results.append({
-                "image_path": path,
-                "is_defective": False,
-                "defect_types": [],
-                "details": {}
-            })
-    return batch_results
+            print(f"语义索引失败: {e}")
+        state["index_done"] += len(batch)
+        update_pipeline_progress(task_id, state, force=finished)
+
+
+def flush_vector_store():
+    """索引任务结束后把向量库写回磁盘（索引过程中只按 SAVE_INTERVAL 间隔保存）"""
+    try:
+        semantic_search.flush_index()
+    except Exception as e:
+        print(f"保存向量库失败: {e}")
 
 
 def background_processing(task_id: str, folder_path: str):
@@ -184,7 +451,7 @@ def background_processing(task_id: str, folder_path: str):
             "message": "正在扫描文件夹..."
         })
 
-        photo_paths = get_image_files(folder_path)
+        photo_paths, filenames = get_image_files(folder_path)
         total = len(photo_paths)
 
         if total == 0:
@@ -199,85 +466,83 @@ def background_processing(task_id: str, folder_path: str):
             "message": f"找到 {total} 张照片，开始处理..."
         })
 
-        quality_results = []
-        batch_size = config.BATCH_SIZE
-
-        for i in range(0, total, batch_size):
-            batch_paths = photo_paths[i:i + batch_size]
-            current = min(i + batch_size, total)
-
-            progress = int(current / total * 100)
-            processing_tasks[task_id].update({
-                "status": "processing",
-                "progress": progress,
-                "current": current,
-                "message": f"正在处理 {current}/{total} 张照片..."
-            })
-
-            with ThreadPoolExecutor(max_workers=config.MAX_WORKERS) as executor:
-                sub_batch_size = max(1, batch_size // config.MAX_WORKERS)
-                futures = []
-
-                for j in range(0, len(batch_paths), sub_batch_size):
-                    sub_batch = batch_paths[j:j + sub_batch_size]
-                    futures.append(executor.submit(process_batch_photos, sub_batch))
-
-                for future in as_completed(futures):
-                    try:
-                        batch_results = future.result()
-                        quality_results.extend(batch_results)
-                    except Exception as e:
-                        print(f"批次处理失败: {e}")
+        # 检测结果按列收集：路径、是否废片、缺陷类型
+        paths: List[str] = []
+        defective = array("b")
+        defect_types: List[list] = []
+        results_by_path = {}
+        batch_size = BATCH_SIZE
+
+        # 质量检测（生产者）与语义索引（消费者）并行：合格照片检测完立即进入索引队列
+        index_queue = queue.Queue(maxsize=INDEX_QUEUE_SIZE)
+        # skipped：不需要索引的照片数（废片，以及索引线程退出后剩余的合格照片）
+        state = {"total": total, "checked": 0, "index_done": 0, "skipped": 0, "indexed": 0, "last_update": 0.0}
+        consumer = threading.Thread(
+            target=index_consumer, args=(task_id, index_queue, state), name="indexer", daemon=True
+        )
+        consumer.start()
+        indexing = True
 
-        quality_checker.clear_cache()
-
-        qualified_photos = [r["image_path"] for r in quality_results if not r["is_defective"]]
-
-        indexed_count = 0
-        if qualified_photos:
-            processing_tasks[task_id].update({
-                "message": f"正在建立语义索引 ({len(qualified_photos)} 张合格照片)..."
-            })
-
-            search_batch_size = config.SEARCH_BATCH_SIZE
-            for i in range(0, len(qualified_photos), search_batch_size):
-                batch = qualified_photos[i:i + search_batch_size]
-                clear_flag = (i == 0)
-                indexed_count += semantic_search.index_photos(batch, clear_existing=clear_flag)
-
-                idx_progress = int((i + len(batch)) / len(qualified_photos) * 30)
-                processing_tasks[task_id].update({
-                    "progress": 70 + idx_progress,
-                    "message": f"语义索引进度: {min(i + search_batch_size, len(qualified_photos))}/{len(qualified_photos)}"
-                })
-
-        global processed_photos, QUALIFIED_PHOTOS
-        processed_photos = {r["image_path"]: r for r in quality_results}
-        QUALIFIED_PHOTOS = qualified_photos
+        try:
+            for i in range(0, total, batch_size):
+                batch_paths = photo_paths[i:i + batch_size]
+                batch_results = process_batch_photos(batch_paths, with_thumbnails=True)
+
+                for r, filename in zip(batch_results, filenames[i:i + batch_size]):
+                    r["filename"] = filename
+                    # 缩略图和内容哈希只交给索引队列，不保留在结果里
+                    thumbnail = r.pop("thumbnail", None)
+                    photo_hash = r.pop("hash", None)
+                    paths.append(r["image_path"])
+                    defective.append(r["is_defective"])
+                    defect_types.append(r["defect_types"])
+                    results_by_path[r["image_path"]] = r
+                    if not r["is_defective"] and indexing:
+                        indexing = put_index_item(index_queue, (r["image_path"], thumbnail, photo_hash), consumer)
+                        if not indexing:
+                            print("⚠️  语义索引线程已退出，剩余照片只做质量检测")
+                    if r["is_defective"] or not indexing:
+                        state["skipped"] += 1
+
+                state["checked"] += len(batch_paths)
+                update_pipeline_progress(task_id, state, force=state["checked"] == total)
+        finally:
+            # 通知消费者结束并等待剩余照片索引完成（消费者已退出时两步都会立即返回）
+            put_index_item(index_queue, None, consumer)
+            consumer.join()
+            flush_vector_store()
+
+        qualified_photos = [p for p, d in zip(paths, defective) if not d]
+        indexed_count = state["indexed"]
+
+        global processed_photos
+        processed_photos = results_by_path
+        QUALIFIED_PHOTOS.clear()
+        QUALIFIED_PHOTOS.update(qualified_photos)
 
         total_photos = total
-        bad_photos = sum(1 for r in quality_results if r["is_defective"])
+        bad_photos = sum(defective)
         qualified_photos_count = len(qualified_photos)
 
-        result_data = serialize_for_json({
+        # 结果中的numpy类型由 orjson 在完成时统一序列化
+        result_data = {
             "total_photos": total_photos,
             "bad_photos": bad_photos,
             "qualified_photos": qualified_photos_count,
             "indexed_photos": indexed_count,
-            "photos": [{
-                "image_path": r["image_path"],
-                "filename": os.path.basename(r["image_path"]),
-                "is_defective": bool(r["is_defective"]),
-                "defect_types": r["defect_types"]
-            } for r in quality_results]
-        })
+            "photos": photo_columns(paths, filenames, defective, defect_types)
+        }
 
-        processing_tasks[task_id].update({
+        completed = {
+            **processing_tasks[task_id],
             "status": "completed",
             "progress": 100,
             "message": "处理完成！",
             "result": result_data
-        })
+        }
+        # 完成时只序列化一次，之后的进度查询直接返回这份JSON
+        completed["result_json"] = orjson.dumps(completed, option=orjson.OPT_SERIALIZE_NUMPY)
+        processing_tasks[task_id] = completed
 
     except Exception as e:
         processing_tasks[task_id].update({
@@ -298,15 +563,14 @@ async def root():
             "/process_photos": "POST处理照片",
             "/process_photos_async": "异步处理",
             "/processing_status/{task_id}": "查询进度",
-            "/search_photos": "搜索照片"
+            "/search_photos": "搜索照片",
+            "/search_batch": "批量搜索照片"
         }
     }
 
 
-@app.get("/demo")
-async def demo():
-    """提供简单的Web界面"""
-    html_content = """
+# 简单演示页面内容固定，导入时编码一次；响应对象每次请求新建（中间件会原地修改响应头，不能共用）
+_DEMO_HTML = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -421,8 +685,13 @@ async def demo():
         </script>
     </body>
     </html>
-    """
-    return HTMLResponse(content=html_content)
+""".encode()
+
+
+@app.get("/demo")
+async def demo():
+    """提供简单的Web界面"""
+    return HTMLResponse(content=_DEMO_HTML)
 
 
 @app.post("/process_photos")
@@ -432,48 +701,64 @@ async def process_photos_sync(request: FolderRequest):
     if not os.path.exists(folder_path):
         return {"status": "error", "message": "文件夹路径不存在！"}
 
-    photo_paths = get_image_files(folder_path)
+    # 耗时的质量检测和索引放到线程池中执行，避免阻塞事件循环
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(PROCESSING_POOL, process_folder, folder_path)
+
+
+def process_folder(folder_path: str) -> dict:
+    """同步处理整个文件夹（阻塞操作，需在线程池中调用）"""
+    photo_paths, filenames = get_image_files(folder_path)
     if not photo_paths:
         return {"status": "error", "message": "文件夹中未找到图片文件！"}
 
     print(f"开始处理 {len(photo_paths)} 张照片...")
 
-    quality_results = []
-    for i, photo_path in enumerate(photo_paths):
-        if i % 100 == 0:
-            print(f"处理进度: {i}/{len(photo_paths)}")
-        result = quality_checker.check_photo_quality(photo_path)
-        quality_results.append(result)
-
-    qualified_photos = [r["image_path"] for r in quality_results if not r["is_defective"]]
-
-    indexed_count = semantic_search.index_photos(qualified_photos) if qualified_photos else 0
-
-    global processed_photos, QUALIFIED_PHOTOS
-    processed_photos = {r["image_path"]: r for r in quality_results}
-    QUALIFIED_PHOTOS = qualified_photos
+    paths: List[str] = []
+    defective = array("b")
+    defect_types: List[list] = []
+    results_by_path = {}
+    qualified_hashes = []
+    for result, filename in zip(process_batch_photos(photo_paths), filenames):
+        result["filename"] = filename
+        # 质量缓存命中时带有内容哈希，索引时不必再读文件
+        photo_hash = result.pop("hash", None)
+        paths.append(result["image_path"])
+        defective.append(result["is_defective"])
+        defect_types.append(result["defect_types"])
+        results_by_path[result["image_path"]] = result
+        if not result["is_defective"]:
+            qualified_hashes.append(photo_hash)
+
+    qualified_photos = [p for p, d in zip(paths, defective) if not d]
+
+    indexed_count = index_new_photos(
+        qualified_photos, semantic_search.get_indexed_hashes(), hashes=qualified_hashes
+    ) if qualified_photos else 0
+    flush_vector_store()
+
+    global processed_photos
+    processed_photos = results_by_path
+    QUALIFIED_PHOTOS.clear()
+    QUALIFIED_PHOTOS.update(qualified_photos)
 
     total_photos = len(photo_paths)
-    bad_photos = sum(1 for r in quality_results if r["is_defective"])
+    bad_photos = sum(defective)
     qualified_photos_count = len(qualified_photos)
 
-    return serialize_for_json({
+    # 直接返回 ORJSONResponse，numpy类型由 orjson 原生处理
+    return ORJSONResponse({
         "status": "success",
         "total_photos": total_photos,
         "bad_photos": bad_photos,
         "qualified_photos": qualified_photos_count,
         "indexed_photos": indexed_count,
-        "photos": [{
-            "image_path": r["image_path"],
-            "filename": os.path.basename(r["image_path"]),
-            "is_defective": bool(r["is_defective"]),
-            "defect_types": r["defect_types"]
-        } for r in quality_results]
+        "photos": photo_columns(paths, filenames, defective, defect_types)
     })
 
 
 @app.post("/process_photos_async")
-async def process_photos_async(request: FolderRequest, background_tasks: BackgroundTasks):
+async def process_photos_async(request: FolderRequest):
     folder_path = request.folder_path
 
     if not os.path.exists(folder_path):
@@ -491,7 +776,7 @@ async def process_photos_async(request: FolderRequest, background_tasks: Backgro
         "result": None
     }
 
-    background_tasks.add_task(background_processing, task_id, folder_path)
+    PROCESSING_POOL.submit(background_processing, task_id, folder_path)
 
     return {
         "status": "started",
@@ -506,30 +791,74 @@ async def get_processing_status(task_id: str):
         raise HTTPException(status_code=404, detail="任务不存在")
 
     task_info = processing_tasks[task_id]
-    serialized = json.loads(json.dumps(task_info, cls=NumpyEncoder))
-    return serialized
+    result_json = task_info.get("result_json")
+    if result_json is not None:
+        return Response(content=result_json, media_type="application/json")
+    return task_info
+
+
+def ndjson_lines(rows: List[dict]):
+    """逐行序列化结果（NDJSON），每产出一行就发送给客户端"""
+    for row in rows:
+        yield orjson.dumps(row) + b"\n"
 
 
 @app.post("/search_photos")
-async def search_photos(query: SearchQuery):
+async def search_photos(query: SearchQuery, accept: str = Header("")):
+    """语义搜索照片
+
+    请求头 Accept 包含 application/x-ndjson 时按NDJSON逐条流式返回结果，
+    否则返回 {"results": [...]}（兼容旧的调用方式）
+    """
     if not QUALIFIED_PHOTOS:
         raise HTTPException(status_code=400, detail="请先处理照片文件夹")
 
-    results = semantic_search.search_photos(query.query, query.top_k)
+    # 搜索在语义搜索进程中执行，这里只等待管道返回，放到线程池避免阻塞事件循环
+    loop = asyncio.get_running_loop()
+    results = await loop.run_in_executor(None, semantic_search.search_photos, query.query, query.top_k)
+    if "application/x-ndjson" in accept:
+        return StreamingResponse(ndjson_lines(results), media_type="application/x-ndjson")
     return {"results": results}
 
 
-@app.get("/get_photo/{photo_path:path}")
-async def get_photo(photo_path: str):
-    if not os.path.exists(photo_path):
-        raise HTTPException(status_code=404, detail="照片不存在")
-    return FileResponse(photo_path)
+@app.post("/search_batch")
+async def search_batch(query: BatchSearchQuery):
+    """批量语义搜索：多个查询一起检索，results 与 queries 一一对应"""
+    if not QUALIFIED_PHOTOS:
+        raise HTTPException(status_code=400, detail="请先处理照片文件夹")
+    if not query.queries or len(query.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"查询数量应为 1~{MAX_BATCH_QUERIES} 个")
 
+    loop = asyncio.get_running_loop()
+    results = await loop.run_in_executor(None, semantic_search.search_photos_batch, query.queries, query.top_k)
+    return {"results": results}
 
-@app.get("/web")
-async def web_interface():
-    """提供完整的前端界面"""
-    html_content = """
+
+def photo_response(photo_path: str):
+    """构造照片响应，文件不存在时返回 None
+
+    配置了 ACCEL_REDIRECT_PREFIX 时只返回 X-Accel-Redirect 头，由nginx零拷贝发送文件；
+    否则用 FileResponse 发送，并复用这里的 stat 结果，避免重复 stat
+    """
+    try:
+        stat_result = os.stat(photo_path)
+    except OSError:
+        return None
+
+    if config.ACCEL_REDIRECT_PREFIX:
+        media_type = mimetypes.guess_type(photo_path)[0] or "application/octet-stream"
+        return Response(
+            media_type=media_type,
+            headers={
+                "X-Accel-Redirect": config.ACCEL_REDIRECT_PREFIX + quote(os.path.abspath(photo_path)),
+                "Cache-Control": PHOTO_CACHE_CONTROL
+            }
+        )
+    return FileResponse(photo_path, stat_result=stat_result, headers={"Cache-Control": PHOTO_CACHE_CONTROL})
+
+
+# 完整前端页面内容固定，导入时编码一次；响应对象每次请求新建（中间件会原地修改响应头，不能共用）
+_WEB_HTML = """
     <!DOCTYPE html>
     <html lang="zh-CN">
     <head>
@@ -636,7 +965,7 @@ async def web_interface():
 
         <script>
             let currentTaskId = null;
-            let processedPhotos = [];
+            let processedPhotos = null;
 
             async function processPhotos() {
                 const path = document.getElementById('folderPath').value.trim();
@@ -734,39 +1063,37 @@ async def web_interface():
                 `;
                 document.getElementById('statsGrid').innerHTML = statsHtml;
 
-                // 存储照片数据
-                processedPhotos = result.photos || [];
+                // 存储照片数据（按列返回，各列按下标对齐）
+                processedPhotos = result.photos || null;
                 renderPhotos();
             }
 
             function renderPhotos(filter = 'all') {
                 const photoGrid = document.getElementById('photoGrid');
+                const count = processedPhotos ? processedPhotos.image_paths.length : 0;
 
-                if (processedPhotos.length === 0) {
+                if (count === 0) {
                     photoGrid.innerHTML = '<p style="text-align: center; padding: 20px; color: #666;">暂无照片数据</p>';
                     return;
                 }
 
-                let filteredPhotos = processedPhotos;
-                if (filter === 'qualified') {
-                    filteredPhotos = processedPhotos.filter(p => !p.is_defective);
-                } else if (filter === 'defective') {
-                    filteredPhotos = processedPhotos.filter(p => p.is_defective);
-                }
-
+                const { image_paths, filenames, is_defective } = processedPhotos;
                 let html = '';
-                filteredPhotos.forEach(photo => {
+                for (let i = 0; i < count; i++) {
+                    if ((filter === 'qualified' && is_defective[i]) || (filter === 'defective' && !is_defective[i])) {
+                        continue;
+                    }
                     // 使用后端API获取图片
-                    const imageUrl = `/get_photo/${encodeURIComponent(photo.image_path)}`;
+                    const imageUrl = `/get_photo/${encodeURIComponent(image_paths[i])}`;
 
                     html += `
                         <div class="photo-item">
-                            <img src="${imageUrl}" alt="${photo.filename}" 
+                            <img src="${imageUrl}" alt="${filenames[i]}" 
                                  onerror="this.onerror=null; this.src='data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iMjAwIiBoZWlnaHQ9IjE1MCIgdmlld0JveD0iMCAwIDIwMCAxNTAiIGZpbGw9IiNmMGYwZjAiPjxyZWN0IHdpZHRoPSIyMDAiIGhlaWdodD0iMTUwIi8+PHRleHQgeD0iMTAwIiB5PSI3NSIgZm9udC1mYW1pbHk9IkFyaWFsIiBmb250LXNpemU9IjE0IiBmaWxsPSIjYWFhIiB0ZXh0LWFuY2hvcj0ibWlkZGxlIiBkeT0iLjNlbSI+PGltYWdlIC8+PC90ZXh0Pjwvc3ZnPgo='">
-                            ${photo.is_defective ? '<div style="position: absolute; top: 10px; right: 10px; background: red; color: white; padding: 3px 8px; border-radius: 10px; font-size: 12px;">废片</div>' : ''}
+                            ${is_defective[i] ? '<div style="position: absolute; top: 10px; right: 10px; background: red; color: white; padding: 3px 8px; border-radius: 10px; font-size: 12px;">废片</div>' : ''}
                         </div>
                     `;
-                });
+                }
 
                 photoGrid.innerHTML = html;
             }
@@ -828,53 +1155,55 @@ async def web_interface():
         </script>
     </body>
     </html>
-    """
-    return HTMLResponse(content=html_content)
-
-
-@app.get("/get_photo/{photo_path:path}")
-async def get_photo(photo_path: str):
-    """获取照片文件 - 修复版"""
-    try:
-        # 解码路径
-        from urllib.parse import unquote
-        photo_path = unquote(photo_path)
-
-        # 检查文件是否存在
-        if os.path.exists(photo_path):
-            return FileResponse(photo_path)
+""".encode()
 
-        # 尝试在PHOTOS_DIR中查找
-        filename = os.path.basename(photo_path)
-        local_path = os.path.join(config.PHOTOS_DIR, filename)
-        if os.path.exists(local_path):
-            return FileResponse(local_path)
 
-        # 尝试在临时上传目录中查找
-        temp_photos = glob.glob(os.path.join(config.TEMP_UPLOAD_DIR, "*", "*"))
-        for temp_path in temp_photos:
-            if os.path.basename(temp_path) == filename:
-                return FileResponse(temp_path)
-
-        # 返回404
-        raise HTTPException(status_code=404, detail="照片不存在")
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"获取照片失败: {str(e)}")
-# 静态文件服务
-import shutil
+@app.get("/web")
+async def web_interface():
+    """提供完整的前端界面"""
+    return HTMLResponse(content=_WEB_HTML)
 
-for file in ["index.html", "style.css", "app.js"]:
-    src = os.path.join(config.BASE_DIR, file)
-    dst = os.path.join(config.STATIC_DIR, file)
-    if os.path.exists(src) and not os.path.exists(dst):
-        try:
-            shutil.copy2(src, dst)
-            print(f"✅ 复制 {file} 到 frontend 目录")
-        except Exception as e:
-            print(f"❌ 复制 {file} 失败: {e}")
 
-app.mount("/frontend", StaticFiles(directory=config.STATIC_DIR), name="frontend")
+@app.get("/get_photo/{photo_path:path}")
+async def get_photo(photo_path: str):
+    """获取照片文件：先按原路径，再按文件名在已扫描/上传的照片和 PHOTOS_DIR 中查找（均为O(1)）"""
+    response = photo_response(photo_path)
+    if response is not None:
+        return response
+
+    filename = os.path.basename(photo_path)
+    for candidate in (PHOTO_INDEX.get(filename), os.path.join(config.PHOTOS_DIR_STR, filename)):
+        if candidate:
+            response = photo_response(candidate)
+            if response is not None:
+                return response
+
+    raise HTTPException(status_code=404, detail="照片不存在")
+@app.on_event("startup")
+async def startup():
+    """启动时创建数据目录并准备静态文件"""
+    # 默认线程池只执行短请求（搜索、aiofiles 上传写入等），文件夹处理在 PROCESSING_POOL 中
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=REQUEST_THREADS, thread_name_prefix="worker")
+    )
+    config.ensure_dirs()
+    # 之后启动的工作进程直接从共享内存读取配置
+    share_config()
+    semantic_search.start()
+
+    for file in ["index.html", "style.css", "app.js"]:
+        src = os.path.join(config.BASE_DIR, file)
+        dst = os.path.join(config.STATIC_DIR_STR, file)
+        if os.path.exists(src) and not os.path.exists(dst):
+            try:
+                shutil.copy2(src, dst)
+                print(f"✅ 复制 {file} 到 frontend 目录")
+            except Exception as e:
+                print(f"❌ 复制 {file} 失败: {e}")
+
+
+# 静态文件服务（目录在启动时创建，这里不检查）
+app.mount("/frontend", StaticFiles(directory=config.STATIC_DIR_STR, check_dir=False), name="frontend")
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,59 +1,167 @@
 import cv2
 import numpy as np
-from PIL import Image
 import os
-from config import config
+import mmap
+import sqlite3
+import threading
+import multiprocessing
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+from config import (
+    config,
+    MAX_WORKERS,
+    BLUR_THRESHOLD,
+    OVEREXPOSURE_THRESHOLD,
+    UNDEREXPOSURE_THRESHOLD,
+    MAX_IMAGE_SIZE,
+    RESIZE_SCALE,
+    IMAGE_CACHE_SIZE,
+)
+from content_hash import buffer_hash
+from image_decode import REDUCED_FLAGS, reduce_factor, imread, clip_thumbnail
+
+# 持久化的质量检测缓存（SQLite），服务重启后未变化的照片不再解码
+QUALITY_CACHE_FILE = os.path.join(config.DATA_DIR, "quality_cache.sqlite3")
+# 检测指标算法的版本，修改解码缩放或指标计算方式时递增，使已缓存的分数失效
+QUALITY_CACHE_VERSION = 1
+# 影响缓存中检测指标的设置，与数据库中记录的不一致时清空缓存
+_CACHE_SETTINGS = f"v{QUALITY_CACHE_VERSION} resize_scale={RESIZE_SCALE} max_image_size={MAX_IMAGE_SIZE}"
+# 单条查询语句中最多的路径参数个数（低于SQLite默认的参数上限）
+_CACHE_LOOKUP_CHUNK = 500
+
+# 曝光检测：超过该像素数的图按步长抽样统计；过曝/欠曝的亮度边界（与原64级直方图的分桶边界一致）
+EXPOSURE_SAMPLE_PIXELS = 1000000
+EXPOSURE_SAMPLE_STEP = 5
+OVEREXPOSED_LEVEL = 240
+UNDEREXPOSED_LEVEL = 16
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, fastmath=True)
+    def _laplacian_at(above, row, below, xm, x, xp):
+        """单个像素的3×3拉普拉斯响应（核与 cv2.Laplacian(ksize=3) 相同: [2 0 2; 0 -8 0; 2 0 2]）"""
+        corners = np.int32(above[xm]) + np.int32(above[xp]) + np.int32(below[xm]) + np.int32(below[xp])
+        return np.float64(2 * corners - 8 * np.int32(row[x]))
+
+    @njit(cache=True, fastmath=True)
+    def _quality_kernel(img, step, over_level, under_level):
+        """一次遍历灰度图，同时计算拉普拉斯响应的方差和抽样像素中过曝/欠曝的数量
+
+        边界按 BORDER_REFLECT_101 处理（第 -1 行/列取第 1 行/列，第 h/w 行/列取倒数第 2 行/列）；
+        边界反射只在行和首尾两列上处理，内部列的循环没有分支，可以向量化。要求图像两边都不小于3
+        """
+        h, w = img.shape
+        total = 0.0
+        total_sq = 0.0
+        over = 0
+        under = 0
+        for y in range(h):
+            above = img[y - 1 if y > 0 else 1]
+            row = img[y]
+            below = img[y + 1 if y < h - 1 else h - 2]
+
+            v = _laplacian_at(above, row, below, 1, 0, 1)
+            total += v
+            total_sq += v * v
+            v = _laplacian_at(above, row, below, w - 2, w - 1, w - 2)
+            total += v
+            total_sq += v * v
+            for x in range(1, w - 1):
+                v = _laplacian_at(above, row, below, x - 1, x, x + 1)
+                total += v
+                total_sq += v * v
+
+            # 当前行还在缓存中，顺带统计抽样像素
+            if y % step == 0:
+                for x in range(0, w, step):
+                    pixel = row[x]
+                    if pixel >= over_level:
+                        over += 1
+                    elif pixel < under_level:
+                        under += 1
+        n = h * w
+        mean = total / n
+        return total_sq / n - mean * mean, over, under
 
 
 class PhotoQualityChecker:
     def __init__(self):
-        self.blur_threshold = config.BLUR_THRESHOLD
-        self.overexposure_threshold = config.OVEREXPOSURE_THRESHOLD
-        self.underexposure_threshold = config.UNDEREXPOSURE_THRESHOLD
-        self.max_image_size = config.MAX_IMAGE_SIZE
-        self.resize_scale = config.RESIZE_SCALE
+        self.blur_threshold = BLUR_THRESHOLD
+        self.overexposure_threshold = OVEREXPOSURE_THRESHOLD
+        self.underexposure_threshold = UNDEREXPOSURE_THRESHOLD
+        self.max_image_size = MAX_IMAGE_SIZE
+        self.resize_scale = RESIZE_SCALE
 
-        # 图片缓存（线程安全，每个实例独立）
+        # 图片缓存（每个实例独立，多线程批量检测时由锁保护）
         self.image_cache = {}
-        self.cache_size_limit = config.IMAGE_CACHE_SIZE
+        self.cache_size_limit = IMAGE_CACHE_SIZE
+        self._cache_lock = threading.Lock()
+
+    def _shrink(self, img_gray):
+        """如果图片太大，缩小处理"""
+        h, w = img_gray.shape
+        if h * w > self.max_image_size:
+            new_h = int(h * self.resize_scale)
+            new_w = int(w * self.resize_scale)
+            img_gray = cv2.resize(img_gray, (new_w, new_h))
+        return img_gray
 
-    def _get_gray_image(self, image_path):
-        """获取灰度图像（带缓存和缩放）"""
-        if image_path in self.image_cache:
-            return self.image_cache[image_path]
+    def _reduce_factor(self, image_path, min_side=1, buf=None):
+        """按本实例的缩放配置选择解码时的缩小倍数（见 image_decode.reduce_factor）"""
+        return reduce_factor(image_path, min_side, buf, self.resize_scale, self.max_image_size)
+
+    def _fit_gray(self, img_gray, remaining_scale):
+        """把缩小解码后的灰度图缩放到检测尺寸（默认配置下解码倍数正好等于缩放比例，无需再缩放）"""
+        if remaining_scale is None:
+            return self._shrink(img_gray)
+        if remaining_scale < 1:
+            h, w = img_gray.shape
+            img_gray = cv2.resize(img_gray, (max(1, int(w * remaining_scale)), max(1, int(h * remaining_scale))))
+        return img_gray
+
+    def _get_gray_image(self, image_path, buf=None):
+        """获取灰度图像（带缓存和缩放），buf 见 _reduce_factor"""
+        with self._cache_lock:
+            cached = self.image_cache.get(image_path)
+        if cached is not None:
+            return cached
 
         try:
-            # 读取灰度图
-            img_gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+            # 读取灰度图（大图在解码时直接缩小）
+            factor, remaining_scale = self._reduce_factor(image_path, buf=buf)
+            img_gray = imread(image_path, REDUCED_FLAGS[factor][0], buf)
             if img_gray is None:
                 return None
 
-            # 如果图片太大，缩小处理
-            h, w = img_gray.shape
-            if h * w > self.max_image_size:
-                new_h = int(h * self.resize_scale)
-                new_w = int(w * self.resize_scale)
-                img_gray = cv2.resize(img_gray, (new_w, new_h))
+            img_gray = self._fit_gray(img_gray, remaining_scale)
 
-            # 缓存图像
-            if len(self.image_cache) < self.cache_size_limit:
-                self.image_cache[image_path] = img_gray
+            # 缓存图像（解码在锁外进行，只在写入时加锁）
+            with self._cache_lock:
+                if len(self.image_cache) < self.cache_size_limit:
+                    self.image_cache[image_path] = img_gray
 
             return img_gray
         except Exception as e:
             print(f"读取图像失败 {image_path}: {e}")
             return None
 
-    def detect_blur(self, image_path):
-        """基于拉普拉斯算子的模糊检测（优化版）"""
-        img_gray = self._get_gray_image(image_path)
-        if img_gray is None:
-            return {"is_defective": False, "defect_type": None}
+    def _blur_metrics(self, img_gray):
+        """基于拉普拉斯算子的模糊检测（在已解码的灰度图上计算）"""
+        # 使用较小的核计算拉普拉斯算子；阈值判断用单精度足够，内存带宽减半
+        laplacian = cv2.Laplacian(img_gray, cv2.CV_32F, ksize=3)
+        # meanStdDev 一次遍历得到标准差（双精度累加），比 np.var 快
+        _, stddev = cv2.meanStdDev(laplacian)
+        return self._blur_result(stddev[0, 0].item() ** 2)  # .item() 直接得到Python float
 
-        # 使用较小的核计算拉普拉斯算子
-        laplacian = cv2.Laplacian(img_gray, cv2.CV_64F, ksize=3)
-        blur_score = float(np.var(laplacian))  # 转换为Python float
-        is_blurry = bool(blur_score < self.blur_threshold)  # 转换为Python bool
+    def _blur_result(self, blur_score):
+        is_blurry = blur_score < self.blur_threshold  # Python float比较，结果即为Python bool
 
         return {
             "score": blur_score,
@@ -61,32 +169,32 @@ class PhotoQualityChecker:
             "defect_type": "blur" if is_blurry else None
         }
 
-    def detect_exposure(self, image_path):
-        """曝光检测优化版 - 使用抽样"""
-        img_gray = self._get_gray_image(image_path)
-        if img_gray is None:
-            return {"is_defective": False, "defect_type": None}
-
-        # 对大图进行抽样（每5个像素取一个）
-        h, w = img_gray.shape
-        if h * w > 1000000:  # 超过100万像素
-            sample = img_gray[::5, ::5]
-        else:
-            sample = img_gray
+    def _exposure_metrics(self, img_gray):
+        """曝光检测 - 使用抽样（在已解码的灰度图上计算）"""
+        # 对大图进行抽样（每 EXPOSURE_SAMPLE_STEP 个像素取一个）
+        step = self._exposure_step(img_gray)
+        sample = img_gray[::step, ::step] if step > 1 else img_gray
 
-        # 计算直方图（降低精度以加快计算）
-        hist = cv2.calcHist([sample], [0], None, [64], [0, 256])
-        total_pixels = sample.shape[0] * sample.shape[1]
+        # 直接统计超出阈值的像素数，不需要构建直方图
+        total_pixels = sample.size
 
         # 计算过曝和欠曝像素比例
-        # 过曝：亮度>240（在64级直方图中对应>60）
-        # 欠曝：亮度<15（在64级直方图中对应<4）
-        overexposed_pixels = np.sum(hist[60:]) / total_pixels
-        underexposed_pixels = np.sum(hist[:4]) / total_pixels
+        # 过曝：亮度>=240（原直方图第60桶及以上）
+        # 欠曝：亮度<16（原直方图前4桶）
+        # countNonZero 返回Python int，结果字典中不含numpy标量
+        overexposed_pixels = cv2.countNonZero(cv2.compare(sample, OVEREXPOSED_LEVEL, cv2.CMP_GE)) / total_pixels
+        underexposed_pixels = cv2.countNonZero(cv2.compare(sample, UNDEREXPOSED_LEVEL, cv2.CMP_LT)) / total_pixels
+        return self._exposure_result(overexposed_pixels, underexposed_pixels)
+
+    @staticmethod
+    def _exposure_step(img_gray):
+        h, w = img_gray.shape
+        return EXPOSURE_SAMPLE_STEP if h * w > EXPOSURE_SAMPLE_PIXELS else 1
 
-        is_overexposed = bool(overexposed_pixels > self.overexposure_threshold)
-        is_underexposed = bool(underexposed_pixels > self.underexposure_threshold)
-        is_defective = bool(is_overexposed or is_underexposed)
+    def _exposure_result(self, overexposed_pixels, underexposed_pixels):
+        is_overexposed = overexposed_pixels > self.overexposure_threshold
+        is_underexposed = underexposed_pixels > self.underexposure_threshold
+        is_defective = is_overexposed or is_underexposed
 
         defect_type = None
         if is_overexposed:
@@ -95,12 +203,40 @@ class PhotoQualityChecker:
             defect_type = "underexposed"
 
         return {
-            "overexposed_ratio": float(overexposed_pixels),
-            "underexposed_ratio": float(underexposed_pixels),
+            "overexposed_ratio": overexposed_pixels,
+            "underexposed_ratio": underexposed_pixels,
             "is_defective": is_defective,
             "defect_type": defect_type
         }
 
+    def _quality_metrics(self, img_gray):
+        """在同一张灰度图上完成模糊和曝光检测，返回 (模糊结果, 曝光结果)
+
+        装有numba时用融合内核一次遍历完成全部统计；否则（或图像过小时）分别调用OpenCV
+        """
+        h, w = img_gray.shape
+        if not NUMBA_AVAILABLE or h < 3 or w < 3:
+            return self._blur_metrics(img_gray), self._exposure_metrics(img_gray)
+
+        step = self._exposure_step(img_gray)
+        blur_score, over, under = _quality_kernel(img_gray, step, OVEREXPOSED_LEVEL, UNDEREXPOSED_LEVEL)
+        sampled = ((h + step - 1) // step) * ((w + step - 1) // step)
+        return self._blur_result(float(blur_score)), self._exposure_result(over / sampled, under / sampled)
+
+    def detect_blur(self, image_path):
+        """基于拉普拉斯算子的模糊检测（优化版）"""
+        img_gray = self._get_gray_image(image_path)
+        if img_gray is None:
+            return {"is_defective": False, "defect_type": None}
+        return self._blur_metrics(img_gray)
+
+    def detect_exposure(self, image_path):
+        """曝光检测优化版 - 使用抽样"""
+        img_gray = self._get_gray_image(image_path)
+        if img_gray is None:
+            return {"is_defective": False, "defect_type": None}
+        return self._exposure_metrics(img_gray)
+
     def detect_closed_eyes(self, image_path):
         """闭眼检测简化版 - 避免网络问题"""
         # 对于大量图片处理，暂时跳过闭眼检测以避免网络问题
@@ -110,11 +246,31 @@ class PhotoQualityChecker:
             "defect_type": None
         }
 
-    def check_photo_quality(self, image_path):
-        """综合质量检测优化版"""
-        # 并行执行检测
-        blur_result = self.detect_blur(image_path)
-        exposure_result = self.detect_exposure(image_path)
+    def check_photo_quality(self, image_path, img_gray=None):
+        """综合质量检测优化版：灰度图只获取一次，模糊和曝光检测在同一数组上完成
+
+        Args:
+            image_path: 照片路径
+            img_gray: 可选的已解码灰度图（已缩放），不传时读取 image_path
+        """
+        if img_gray is None:
+            img_gray = self._get_gray_image(image_path)
+        if img_gray is None:
+            blur_result = {"is_defective": False, "defect_type": None}
+            exposure_result = {"is_defective": False, "defect_type": None}
+        else:
+            blur_result, exposure_result = self._quality_metrics(img_gray)
+        return self._combine_results(image_path, blur_result, exposure_result)
+
+    def result_from_metrics(self, image_path, blur_score, overexposed_ratio, underexposed_ratio):
+        """由已保存的检测指标还原完整结果（按当前阈值重新判定，不需要解码图像）"""
+        return self._combine_results(
+            image_path,
+            self._blur_result(blur_score),
+            self._exposure_result(overexposed_ratio, underexposed_ratio)
+        )
+
+    def _combine_results(self, image_path, blur_result, exposure_result):
         eyes_result = self.detect_closed_eyes(image_path)
 
         # 综合判断是否为废片
@@ -144,13 +300,254 @@ class PhotoQualityChecker:
             }
         }
 
-    def batch_check_quality(self, image_paths):
-        """批量质量检测（保持接口兼容性）"""
-        results = []
-        for path in image_paths:
-            results.append(self.check_photo_quality(path))
-        return results
+    def _check_photo_quality_safe(self, image_path, img_gray=None):
+        """单张检测，失败时返回不判为废片的默认结果"""
+        try:
+            return self.check_photo_quality(image_path, img_gray)
+        except Exception as e:
+            print(f"处理失败 {image_path}: {e}")
+            return {
+                "image_path": image_path,
+                "is_defective": False,
+                "defect_types": [],
+                "details": {}
+            }
+
+    def check_photo_quality_decoded(self, image_path, embed_size, buf=None):
+        """只解码一次彩色图：灰度图用于质量检测，合格照片同时附带CLIP输入尺寸的RGB缩略图（"thumbnail"）
+
+        buf 为已映射到内存的文件内容（见 map_file）时直接从中解码
+        """
+        # 缩小解码时保证短边不小于CLIP输入尺寸，缩略图质量不受影响
+        factor, remaining_scale = self._reduce_factor(image_path, min_side=embed_size, buf=buf)
+        img = imread(image_path, REDUCED_FLAGS[factor][1], buf)
+        img_gray = None
+        if img is not None:
+            img_gray = self._fit_gray(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), remaining_scale)
+
+        result = self._check_photo_quality_safe(image_path, img_gray)
+        if img is not None and not result["is_defective"]:
+            result["thumbnail"] = clip_thumbnail(img, embed_size)
+        return result
+
+    def batch_check_quality(self, image_paths, executor=None):
+        """批量质量检测（保持接口兼容性）：多进程并行检测，结果顺序与输入一致，单张失败时抛出异常
+
+        子进程中的检测器按配置创建，不继承本实例上修改过的阈值
+
+        Args:
+            image_paths: 照片路径列表
+            executor: 可选的进程池（需以 init_worker_checker 初始化），不传时临时创建
+        """
+        check = partial(check_photo_in_worker, safe=False)
+        chunksize = max(1, len(image_paths) // (MAX_WORKERS * 4))
+        if executor is not None:
+            return list(executor.map(check, image_paths, chunksize=chunksize))
+        with ProcessPoolExecutor(
+            max_workers=MAX_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker_checker
+        ) as pool:
+            return list(pool.map(check, image_paths, chunksize=chunksize))
 
     def clear_cache(self):
         """清理缓存"""
-        self.image_cache.clear()
\ No newline at end of file
+        with self._cache_lock:
+            self.image_cache.clear()
+
+
+class QualityCache:
+    """持久化的质量检测缓存（SQLite）：按 (照片路径, 解码模式) 保存 mtime_ns、大小、模糊分数、曝光比例和内容哈希
+
+    文件的 mtime 和大小都未变化时直接由缓存的指标还原结果，阈值在命中时重新套用，调整阈值不必清空缓存；
+    解码缩放设置（RESIZE_SCALE、MAX_IMAGE_SIZE）或 QUALITY_CACHE_VERSION 变化时清空缓存。
+    解码模式即生成缩略图时的边长（只做质量检测时为0），两种模式缩小解码的倍数不同，模糊分数也不同。
+
+    使用WAL日志，多个服务进程（--workers N）可以同时读写同一个数据库；进程池子进程不访问缓存。
+    数据库无法打开时缓存不生效，读取出错或损坏的记录按未命中处理
+    """
+
+    def __init__(self, checker, path=QUALITY_CACHE_FILE):
+        self.checker = checker
+        self.path = path
+        self._conn = None
+        self._disabled = False
+        # 连接在请求线程和后台处理线程之间共用
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # 缓存丢失最后几次写入无妨，不必每次提交都落盘
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS quality ("
+                "path TEXT, mode INTEGER, mtime_ns INTEGER, size INTEGER, "
+                "blur REAL, overexposed REAL, underexposed REAL, hash TEXT, "
+                "PRIMARY KEY (path, mode))"
+            )
+            row = conn.execute("SELECT value FROM settings WHERE key = 'metrics'").fetchone()
+            if row is None or row[0] != _CACHE_SETTINGS:
+                if row is not None:
+                    print(f"⚠️  质量检测设置已变更 ({row[0]} -> {_CACHE_SETTINGS})，清空质量检测缓存")
+                conn.execute("DELETE FROM quality")
+                conn.execute("INSERT OR REPLACE INTO settings VALUES ('metrics', ?)", (_CACHE_SETTINGS,))
+        return conn
+
+    def _open(self):
+        if self._conn is None and not self._disabled:
+            try:
+                self._conn = self._connect()
+            except sqlite3.Error as e:
+                print(f"⚠️  质量检测缓存不可用: {e}")
+                self._disabled = True
+        return self._conn
+
+    def lookup(self, image_paths, embed_size=None):
+        """批量查询缓存，返回与 image_paths 对应的 [(文件签名, 缓存的检测结果), ...]
+
+        文件无法访问时签名为None；未命中或已失效时结果为None。
+        缓存中有内容哈希时结果附带 "hash"，语义索引可据此跳过已索引的照片
+        """
+        signatures = []
+        for image_path in image_paths:
+            try:
+                st = os.stat(image_path)
+                signatures.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                signatures.append(None)
+
+        rows = {}
+        with self._lock:
+            conn = self._open()
+            if conn is not None:
+                try:
+                    for start in range(0, len(image_paths), _CACHE_LOOKUP_CHUNK):
+                        chunk = image_paths[start:start + _CACHE_LOOKUP_CHUNK]
+                        cursor = conn.execute(
+                            "SELECT path, mtime_ns, size, blur, overexposed, underexposed, hash FROM quality "
+                            f"WHERE mode = ? AND path IN ({','.join('?' * len(chunk))})",
+                            (embed_size or 0, *chunk)
+                        )
+                        rows.update((row[0], row[1:]) for row in cursor)
+                except sqlite3.Error as e:
+                    print(f"⚠️  读取质量检测缓存失败: {e}")
+                    rows = {}
+
+        results = []
+        for image_path, signature in zip(image_paths, signatures):
+            row = rows.get(image_path)
+            cached = None
+            if signature is not None and row is not None and (row[0], row[1]) == signature:
+                cached = self._restore(image_path, row[2:])
+            results.append((signature, cached))
+        return results
+
+    def _restore(self, image_path, row):
+        """由缓存行还原检测结果，记录损坏（字段缺失或类型不对）时返回None"""
+        blur_score, overexposed, underexposed, photo_hash = row
+        try:
+            result = self.checker.result_from_metrics(
+                image_path, float(blur_score), float(overexposed), float(underexposed)
+            )
+        except (TypeError, ValueError):
+            return None
+        if photo_hash and isinstance(photo_hash, str):
+            result["hash"] = photo_hash
+        return result
+
+    def store(self, entries, embed_size=None):
+        """写入一批检测结果，entries: [(照片路径, 检测前 lookup 返回的签名, 检测结果), ...]
+
+        签名取检测前的值，检测期间文件被修改时下次自然失效；读取失败的照片不缓存，下次重试
+        """
+        rows = []
+        for image_path, signature, result in entries:
+            details = result.get("details") or {}
+            blur = details.get("blur", {})
+            exposure = details.get("exposure", {})
+            if signature is None or "score" not in blur or "overexposed_ratio" not in exposure:
+                continue
+            rows.append((
+                image_path, embed_size or 0, *signature, blur["score"],
+                exposure["overexposed_ratio"], exposure["underexposed_ratio"], result.get("hash")
+            ))
+        if not rows:
+            return
+        with self._lock:
+            conn = self._open()
+            if conn is None:
+                return
+            try:
+                with conn:
+                    conn.executemany("INSERT OR REPLACE INTO quality VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            except sqlite3.Error as e:
+                print(f"⚠️  写入质量检测缓存失败: {e}")
+
+    def clear(self):
+        with self._lock:
+            conn = self._open()
+            if conn is None:
+                return
+            try:
+                with conn:
+                    conn.execute("DELETE FROM quality")
+            except sqlite3.Error as e:
+                print(f"⚠️  清空质量检测缓存失败: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def map_file(path):
+    """只读映射整个文件（共享页缓存，不复制到用户态缓冲区），失败（如空文件、无权限）时返回None"""
+    try:
+        with open(path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+
+# 进程池中每个子进程独立持有的检测器，由 init_worker_checker 创建
+_worker_checker = None
+
+
+def init_worker_checker():
+    """进程池初始化函数：在子进程中创建检测器
+
+    并行度由进程数提供，每个子进程内OpenCV只用单线程，避免 进程数×线程数 超过核数
+    """
+    global _worker_checker
+    cv2.setNumThreads(1)
+    _worker_checker = PhotoQualityChecker()
+
+
+def check_photo_in_worker(image_path, embed_size=None, safe=True):
+    """在子进程中检测单张照片
+
+    不传 embed_size 时只返回结果字典（不含图像数据），减少进程间传输；
+    传入时合格照片额外附带CLIP缩略图和内容哈希（"hash"），语义索引不必再次读取、解码和哈希原图。
+    safe 为假时检测失败直接抛出异常（由进程池传回调用方）
+    """
+    try:
+        if embed_size:
+            # 文件只映射一次，解码和内容哈希读取同一份页缓存
+            mapped = map_file(image_path)
+            try:
+                result = _worker_checker.check_photo_quality_decoded(image_path, embed_size, mapped)
+                if mapped is not None and "thumbnail" in result:
+                    result["hash"] = buffer_hash(mapped)
+                return result
+            finally:
+                if mapped is not None:
+                    mapped.close()
+        if not safe:
+            return _worker_checker.check_photo_quality(image_path)
+        return _worker_checker._check_photo_quality_safe(image_path)
+    finally:
+        # 子进程中每张照片只检测一次，灰度图缓存没有复用价值，检测完立即释放
+        _worker_checker.image_cache.pop(image_path, None)
@@ -1,15 +1,54 @@
 import os
-import torch
-import chromadb
-from chromadb import PersistentClient
-from PIL import Image
-from config import config
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from config import config, CLIP_MODEL_NAME, FEATURES, SEARCH_BATCH_SIZE, MAX_WORKERS
+from content_hash import CONTENT_HASH, file_hash
+from vector_store import PhotoVectorStore
+from image_decode import load_clip_thumbnail
+
+# 图像编码批大小自动调优：候选批大小、显存不足时的回退值，以及按设备和模型缓存调优结果的文件
+TUNE_BATCH_SIZES = (64, 128, 256, 512, 1024)
+FALLBACK_BATCH_SIZE = 64
+# CPU上吞吐量很快趋于平稳，更大的批只会多占内存（1024张224×224输入的激活需要数GB），调优时不超过该值
+CPU_MAX_BATCH_SIZE = 128
+BATCH_TUNING_FILE = os.path.join(config.DATA_DIR, "batch_size_tuning.json")
+
+# 查询文本嵌入的LRU缓存容量（模型在运行期间不会变化，缓存无需失效）
+QUERY_CACHE_SIZE = 1024
+# 索引时预取的批次数：当前批在设备上前向时，后面最多这么多批已在后台解码和预处理
+PREFETCH_BATCHES = 2
+
+# CLIP预处理使用的归一化参数（与 clip.load 返回的 preprocess 一致）
+CLIP_MEAN = (0.48145466, 0.4578275, 0.40821073)
+CLIP_STD = (0.26862954, 0.26130258, 0.27577711)
+
+
+@lru_cache(maxsize=None)
+def _torch():
+    """按需导入torch（导入开销较大，只在真正生成嵌入时才加载）"""
+    import torch
+    return torch
+
+
+@lru_cache(maxsize=None)
+def _torchvision():
+    """按需导入torchvision（CLIP依赖它，只在模型加载成功后使用）"""
+    import torchvision
+    import torchvision.transforms.v2
+    return torchvision
 
 
 class PhotoSemanticSearch:
     def __init__(self, collection_name="photo_collection"):
         # 设备选择
-        self.device = "cuda" if torch.cuda.is_available() and config.USE_GPU else "cpu"
+        # 未启用GPU时不探测CUDA，避免初始化CUDA运行时
+        self.device = "cuda" if "gpu" in FEATURES and _torch().cuda.is_available() else "cpu"
         print(f"使用设备: {self.device}")
 
         # 尝试加载CLIP模型
@@ -17,6 +56,15 @@ class PhotoSemanticSearch:
         self.model = None
         self.preprocess = None
         self.clip_module = None  # 保存CLIP模块引用
+        self.batch_size = None  # 首次索引时自动调优
+        self.autocast_dtype = None  # CPU上启用BF16时的自动混合精度类型
+        self.input_resolution = None  # 模型输入边长，质量检测阶段据此生成缩略图
+        # 批量编码时并行解码和预处理图片的线程池
+        self._preprocess_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="preprocess")
+        # 索引流水线的预取线程：逐批组装下一批输入（解码分发给 _preprocess_pool），与前向重叠
+        self._prefetch_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        # 每个实例独立的查询嵌入缓存：规范化查询文本 -> 只读嵌入向量
+        self._query_embedding = lru_cache(maxsize=QUERY_CACHE_SIZE)(self._encode_query)
 
         try:
             import clip  # 使用直接导入
@@ -24,9 +72,17 @@ class PhotoSemanticSearch:
             print(f"✅ 成功导入CLIP模块: {clip.__name__}")
 
             # 加载模型
-            self.model, self.preprocess = self.clip_module.load(config.CLIP_MODEL_NAME, device=self.device)
+            self.model, self.preprocess = self.clip_module.load(CLIP_MODEL_NAME, device=self.device)
+            # GPU上使用FP16权重（clip.load 在CUDA上本就如此，这里显式保证）；
+            # CPU上FP16很慢，只在开启 USE_BF16 时用BF16自动混合精度
+            if self.device == "cuda":
+                self.model = self.model.half()
+            elif "bf16" in FEATURES:
+                self.autocast_dtype = _torch().bfloat16
+            self.input_resolution = getattr(getattr(self.model, "visual", None), "input_resolution", 224)
+            self._build_transforms()
             self.clip_available = True
-            print(f"✅ CLIP模型加载成功: {config.CLIP_MODEL_NAME}")
+            print(f"✅ CLIP模型加载成功: {CLIP_MODEL_NAME}")
             print(f"✅ 模型已加载到: {self.device}")
         except ImportError as e:
             print(f"❌ CLIP导入失败: {e}")
@@ -35,18 +91,40 @@ class PhotoSemanticSearch:
             print(f"⚠️ CLIP模型加载失败: {e}")
             print("⚠️ 语义搜索功能将不可用，质量检测功能正常")
 
-        # 初始化ChromaDB
-        os.makedirs(config.CHROMA_DB_DIR, exist_ok=True)
-        self.client = PersistentClient(path=config.CHROMA_DB_DIR)
+        # 初始化向量库（FAISS内积索引，向量已归一化，内积即余弦相似度）
+        self.store = PhotoVectorStore(collection_name, hash_name=CONTENT_HASH)
 
-        # 获取或创建集合
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            metadata={"hnsw:space": "cosine"}  # 使用余弦相似度
-        )
+    def _build_transforms(self):
+        """构建CLIP归一化的 torchvision v2 变换
+
+        缩放裁剪统一由 image_decode.clip_thumbnail 在CPU线程池中完成（与质量检测阶段的缩略图同一条路径）；
+        转浮点和归一化留到整批搬到设备之后进行，主机到显存只拷贝uint8数据
+        """
+        v2 = _torchvision().transforms.v2
+        self._normalize = v2.Compose([
+            v2.ToDtype(_torch().float32, scale=True),
+            v2.Normalize(mean=CLIP_MEAN, std=CLIP_STD),
+        ])
+
+    def _to_model_input(self, batch):
+        """把uint8批次 (N, 3, H, W) 搬到设备上，再在设备上转浮点并归一化"""
+        if self.device == "cuda" and not batch.is_pinned():
+            batch = batch.pin_memory()  # 锁页内存，配合 non_blocking 异步拷贝到显存
+        return self._normalize(batch.to(self.device, non_blocking=True))
+
+    @contextmanager
+    def _inference(self):
+        """推理上下文：不记录梯度；CPU开启BF16时套上自动混合精度"""
+        torch = _torch()
+        with torch.inference_mode():
+            if self.autocast_dtype is None:
+                yield
+            else:
+                with torch.autocast("cpu", dtype=self.autocast_dtype):
+                    yield
 
     def get_image_embedding(self, image_path):
-        """生成单张图片的CLIP嵌入向量"""
+        """生成单张图片的CLIP嵌入向量（float32 ndarray，形状 (D,)），失败时返回None"""
         if not self.clip_available or self.model is None:
             print("⚠️  CLIP不可用，无法生成图像嵌入")
             return None
@@ -57,23 +135,25 @@ class PhotoSemanticSearch:
                 print(f"❌ 图片不存在: {image_path}")
                 return None
 
-            # 打开并处理图片
-            image = Image.open(image_path).convert("RGB")
-            image_tensor = self.preprocess(image).unsqueeze(0).to(self.device)
+            # 解码并缩放裁剪，归一化在设备上完成
+            image_tensor = self._load_image_tensor(image_path)
+            if image_tensor is None:
+                return None
+            image_tensor = self._to_model_input(image_tensor.unsqueeze(0))
 
-            with torch.no_grad():
-                image_embedding = self.model.encode_image(image_tensor)
+            with self._inference():
+                image_embedding = self.model.encode_image(image_tensor).float()
                 # 归一化向量
                 image_embedding = image_embedding / image_embedding.norm(dim=-1, keepdim=True)
 
-            return image_embedding.cpu().numpy().flatten().tolist()
+            return image_embedding[0].cpu().numpy()
 
         except Exception as e:
             print(f"❌ 生成图片嵌入失败 {image_path}: {e}")
             return None
 
     def get_text_embedding(self, text):
-        """生成文本的CLIP嵌入向量"""
+        """生成文本的CLIP嵌入向量（float32 ndarray，形状 (D,)），失败时返回None"""
         if not self.clip_available or self.model is None or self.clip_module is None:
             print("⚠️  CLIP不可用，无法生成文本嵌入")
             return None
@@ -81,20 +161,165 @@ class PhotoSemanticSearch:
         try:
             # 使用保存的CLIP模块引用
             text_input = self.clip_module.tokenize([text]).to(self.device)
-            with torch.no_grad():
-                text_embedding = self.model.encode_text(text_input)
+            with self._inference():
+                text_embedding = self.model.encode_text(text_input).float()
                 text_embedding = text_embedding / text_embedding.norm(dim=-1, keepdim=True)
-            return text_embedding.cpu().numpy().flatten().tolist()
+            return text_embedding[0].cpu().numpy()
         except Exception as e:
             print(f"❌ 生成文本嵌入失败 '{text}': {e}")
             return None
 
-    def index_photos(self, photo_paths, clear_existing=False):
-        """批量索引合格照片到向量数据库（带重复检查）
+    def _tuning_key(self):
+        torch = _torch()
+        device_name = torch.cuda.get_device_name(0) if self.device == "cuda" else "cpu"
+        precision = "bf16" if self.autocast_dtype is not None else "default"
+        return f"{device_name}|{CLIP_MODEL_NAME}|{precision}"
+
+    def tune_batch_size(self):
+        """在合成输入上测量各候选批大小的图像编码吞吐量，选出最快且显存放得下的批大小
+
+        结果按 (设备名, 模型名) 缓存到磁盘，重启后直接复用
+        """
+        if self.batch_size is not None:
+            return self.batch_size
+        if not self.clip_available or self.model is None:
+            self.batch_size = SEARCH_BATCH_SIZE
+            return self.batch_size
+
+        torch = _torch()
+        key = self._tuning_key()
+        try:
+            with open(BATCH_TUNING_FILE, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            cached = {}
+        if key in cached:
+            self.batch_size = cached[key] if self.device == "cuda" else min(cached[key], CPU_MAX_BATCH_SIZE)
+            print(f"✅ 使用缓存的索引批大小: {self.batch_size} ({key})")
+            return self.batch_size
+
+        print(f"正在自动调优索引批大小 ({key})...")
+        resolution = self.input_resolution
+        oom_error = getattr(torch.cuda, "OutOfMemoryError", RuntimeError)
+
+        def encode(bs):
+            dummy = torch.randn(bs, 3, resolution, resolution, device=self.device)
+            with self._inference():
+                self.model.encode_image(dummy)
+            if self.device == "cuda":
+                torch.cuda.synchronize()
+
+        best_size, best_throughput = FALLBACK_BATCH_SIZE, 0.0
+        bs = 8
+        try:
+            encode(bs)  # 预热，排除首次调用的初始化开销
+            candidates = TUNE_BATCH_SIZES if self.device == "cuda" else \
+                [size for size in TUNE_BATCH_SIZES if size <= CPU_MAX_BATCH_SIZE]
+            for bs in candidates:
+                start = time.perf_counter()
+                encode(bs)
+                throughput = bs / (time.perf_counter() - start)
+                print(f"  批大小 {bs}: {throughput:.1f} 张/秒")
+                if throughput > best_throughput:
+                    best_size, best_throughput = bs, throughput
+                elif throughput < best_throughput * 0.9:
+                    break  # 吞吐量已明显下降，更大的批只会更慢
+        except oom_error:
+            print(f"⚠️  批大小 {bs} 显存不足，停止调优")
+        except Exception as e:
+            print(f"⚠️  批大小调优失败，使用默认值 {FALLBACK_BATCH_SIZE}: {e}")
+            best_size = FALLBACK_BATCH_SIZE
+        finally:
+            if self.device == "cuda":
+                torch.cuda.empty_cache()
+
+        self.batch_size = best_size
+        print(f"✅ 索引批大小: {self.batch_size}")
+
+        cached[key] = best_size
+        try:
+            with open(BATCH_TUNING_FILE, "w", encoding="utf-8") as f:
+                json.dump(cached, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            print(f"⚠️  保存批大小调优结果失败: {e}")
+        return self.batch_size
+
+    def _load_image_tensor(self, photo_path, image=None):
+        """读取并缩放裁剪单张图片，返回uint8张量 (3, H, W)，读取失败时返回None
+
+        已有质量检测阶段生成的RGB缩略图（uint8, H×W×3）时直接转换，不再读取原图；
+        否则按与质量检测相同的解码倍数和缩放方式生成缩略图，同一张照片的嵌入不随缓存命中与否变化
+        """
+        try:
+            if image is None:
+                image = load_clip_thumbnail(photo_path, self.input_resolution)
+                if image is None:
+                    raise ValueError("无法解码图片")
+            return _torch().from_numpy(image).permute(2, 0, 1)
+        except Exception as e:
+            print(f"❌ 读取图片失败 {photo_path}: {e}")
+            return None
+
+    def _prepare_batch(self, photo_paths, images):
+        """多线程解码并预处理一批图片，返回 (读取成功的位置, uint8批次 (N, 3, H, W))，全部失败时批次为None
+
+        CUDA下顺便复制到锁页内存，在预取线程中调用时这一步也与前向重叠
+        """
+        # 解码和缩放在C++中执行并释放GIL，多线程可以并行
+        tensors = list(self._preprocess_pool.map(self._load_image_tensor, photo_paths, images))
+        positions = [pos for pos, tensor in enumerate(tensors) if tensor is not None]
+        if not positions:
+            return positions, None
+
+        try:
+            batch = _torch().stack([tensors[pos] for pos in positions])
+            if self.device == "cuda":
+                batch = batch.pin_memory()
+            return positions, batch
+        except Exception as e:
+            print(f"❌ 批量预处理图片失败: {e}")
+            return [], None
+
+    def _embed_prepared(self, count, positions, batch):
+        """对 _prepare_batch 的结果做一次前向，返回长度为 count 的嵌入列表，失败的位置为None"""
+        torch = _torch()
+        results = [None] * count
+        if batch is None:
+            return results
+
+        try:
+            batch = self._to_model_input(batch)
+            with self._inference():
+                image_embeddings = self.model.encode_image(batch)
+                image_embeddings = torch.nn.functional.normalize(image_embeddings.float(), dim=-1)
+            # 每个位置是整批数组的一行视图，不逐个转换成Python列表
+            for pos, embedding in zip(positions, image_embeddings.cpu().numpy()):
+                results[pos] = embedding
+        except Exception as e:
+            print(f"❌ 批量生成图片嵌入失败: {e}")
+        return results
+
+    def get_image_embeddings_batch(self, photo_paths, images=None):
+        """批量生成图片的CLIP嵌入向量：多线程并行解码和预处理，整批只做一次前向
 
         Args:
             photo_paths: 照片路径列表
-            clear_existing: 是否清空已有数据（默认False，增量添加）
+            images: 可选，与 photo_paths 对应的已解码缩略图，有缩略图的照片不再读取原图
+
+        Returns:
+            与 photo_paths 对应的嵌入列表，读取或编码失败的位置为None
+        """
+        if images is None:
+            images = [None] * len(photo_paths)
+        return self._embed_prepared(len(photo_paths), *self._prepare_batch(photo_paths, images))
+
+    def index_photos(self, photo_paths, hashes=None, images=None):
+        """批量索引合格照片到向量数据库（以内容哈希作为ID，重复内容只索引一次）
+
+        Args:
+            photo_paths: 照片路径列表
+            hashes: 与 photo_paths 对应的内容哈希（见 file_hash），不传时在这里计算
+            images: 可选，与 photo_paths 对应的已解码缩略图（见 clip_thumbnail），为None的照片从磁盘读取
         """
         if not photo_paths:
             print("⚠️  没有照片需要索引")
@@ -106,12 +331,10 @@ class PhotoSemanticSearch:
 
         print(f"✅ CLIP可用，开始索引 {len(photo_paths)} 张照片...")
 
-        # 可选：清空现有数据（只在第一次调用时清空）
-        if clear_existing:
-            existing_count = self.collection.count()
-            if existing_count > 0:
-                print(f"清空现有 {existing_count} 条记录...")
-                self.clear_collection()
+        if hashes is None:
+            hashes = [file_hash(p) for p in photo_paths]
+        if images is None:
+            images = [None] * len(photo_paths)
 
         ids = []
         embeddings = []
@@ -120,64 +343,76 @@ class PhotoSemanticSearch:
         indexed_count = 0
         failed_count = 0
 
-        # 用于检查重复文件名
-        indexed_filenames = set()
-
-        for idx, photo_path in enumerate(photo_paths):
-            # 每处理50张打印一次进度
-            if idx % 50 == 0:
-                print(f"  索引进度: {idx}/{len(photo_paths)}")
+        # 用于检查重复内容（同一批次内相同照片只索引一次）
+        indexed_hashes = set()
 
-            # 检查文件是否存在
-            if not os.path.exists(photo_path):
+        # 先筛掉不存在和重复的照片，再按调优后的批大小批量生成嵌入
+        candidates = []
+        for idx, (photo_path, photo_hash, image) in enumerate(zip(photo_paths, hashes, images)):
+            # 检查文件是否存在（哈希为空说明文件无法读取）
+            if photo_hash is None or not os.path.exists(photo_path):
                 print(f"❌ 文件不存在，跳过: {photo_path}")
                 failed_count += 1
                 continue
 
             filename = os.path.basename(photo_path)
 
-            # 检查是否已索引（基于文件名）
-            if filename in indexed_filenames:
+            # 检查是否已索引（基于内容哈希）
+            if photo_hash in indexed_hashes:
                 print(f"⚠️  文件已索引，跳过重复: {filename}")
                 continue
+            indexed_hashes.add(photo_hash)
+            candidates.append((idx, photo_path, photo_hash, filename, image))
+
+        batch_size = self.tune_batch_size()
+        chunks = [candidates[start:start + batch_size] for start in range(0, len(candidates), batch_size)]
+
+        def prefetch(k):
+            chunk = chunks[k]
+            return self._prefetch_pool.submit(self._prepare_batch, [c[1] for c in chunk], [c[4] for c in chunk])
+
+        # 流水线：当前批在设备上前向时，预取线程已在解码后续批次，设备不必等待读图
+        pending = deque(prefetch(k) for k in range(min(PREFETCH_BATCHES, len(chunks))))
+        for k, chunk in enumerate(chunks):
+            print(f"  索引进度: {k * batch_size}/{len(candidates)}")
+            prepared = pending.popleft().result()
+            if k + PREFETCH_BATCHES < len(chunks):
+                pending.append(prefetch(k + PREFETCH_BATCHES))
+            chunk_embeddings = self._embed_prepared(len(chunk), *prepared)
+
+            for (idx, photo_path, photo_hash, filename, _), embedding in zip(chunk, chunk_embeddings):
+                if embedding is None:
+                    print(f"⚠️  嵌入生成失败，跳过: {filename}")
+                    failed_count += 1
+                    continue
 
-            # 生成嵌入向量
-            embedding = self.get_image_embedding(photo_path)
-            if embedding:
-                # 检查嵌入向量是否有效（不全为0）
-                if all(abs(v) < 0.000001 for v in embedding[:10]):  # 使用小阈值检查是否为0
+                # 检查嵌入向量是否有效（不全为0），一次向量化归约完成
+                if np.abs(embedding).max() < 1e-6:
                     print(f"⚠️  嵌入向量接近0，跳过: {filename}")
                     failed_count += 1
                     continue
 
-                # 创建唯一ID
-                photo_id = f"{filename}_{idx}"
-                ids.append(photo_id)
+                # 以内容哈希作为唯一ID
+                ids.append(photo_hash)
                 embeddings.append(embedding)
                 metadatas.append({
                     "path": photo_path,
                     "filename": filename,
+                    "hash": photo_hash,
                     "index": idx
                 })
-                indexed_filenames.add(filename)
                 indexed_count += 1
-            else:
-                print(f"⚠️  嵌入生成失败，跳过: {filename}")
-                failed_count += 1
 
         # 批量添加到数据库
         if ids:
             try:
                 print(f"正在添加 {len(ids)} 个嵌入到数据库...")
-                self.collection.add(
-                    ids=ids,
-                    embeddings=embeddings,
-                    metadatas=metadatas
-                )
+                # 整批向量一次写入索引
+                self.store.upsert(ids, np.stack(embeddings), metadatas)
                 print(f"✅ 成功索引 {len(ids)} 张照片到向量数据库")
 
                 # 验证添加的数量
-                new_count = self.collection.count()
+                new_count = self.store.count()
                 print(f"✅ 向量数据库现在有 {new_count} 张照片")
 
             except Exception as e:
@@ -189,6 +424,34 @@ class PhotoSemanticSearch:
         print(f"📊 索引统计: 成功 {indexed_count}, 失败 {failed_count}")
         return indexed_count
 
+    def get_indexed_hashes(self):
+        """返回已索引照片的 {内容哈希: 路径}"""
+        return self.store.hashes()
+
+    def update_photo_paths(self, moved):
+        """更新已索引照片的路径（内容未变，无需重新生成嵌入）
+
+        Args:
+            moved: {内容哈希: 新路径}
+        """
+        self.store.update_metadata({
+            photo_hash: {"path": path, "filename": os.path.basename(path)}
+            for photo_hash, path in moved.items()
+        })
+
+    def flush_index(self):
+        """把向量库中尚未写回的修改保存到磁盘"""
+        self.store.flush()
+
+    def _encode_query(self, key):
+        """生成规范化查询文本的嵌入，失败时抛出异常，失败结果不会进入缓存"""
+        embedding = self.get_text_embedding(key)
+        if embedding is None:
+            raise ValueError(f"文本嵌入生成失败: {key!r}")
+        # 缓存的数组被多次查询共用，设为只读防止被意外修改
+        embedding.setflags(write=False)
+        return embedding
+
     def search_photos(self, query_text, top_k=10):
         """基于自然语言查询搜索相似照片"""
         if not self.clip_available:
@@ -197,14 +460,16 @@ class PhotoSemanticSearch:
 
         print(f"🔍 语义搜索: '{query_text}'，查找 {top_k} 个结果")
 
-        # 生成查询文本嵌入
-        text_embedding = self.get_text_embedding(query_text)
-        if not text_embedding:
+        # 生成查询文本嵌入：CLIP分词本身会转小写并合并空白，按同样规则规范化后缓存，重复查询跳过编码
+        key = " ".join(query_text.split()).lower()
+        try:
+            text_embedding = self._query_embedding(key)
+        except ValueError:
             print("❌ 文本嵌入生成失败")
             return []
 
-        # 获取集合中的照片数量
-        collection_count = self.collection.count()
+        # 获取向量库中的照片数量
+        collection_count = self.store.count()
         print(f"✅ 向量数据库中有 {collection_count} 张照片")
 
         if collection_count == 0:
@@ -213,56 +478,79 @@ class PhotoSemanticSearch:
 
         # 向量检索
         try:
-            results = self.collection.query(
-                query_embeddings=[text_embedding],
-                n_results=min(top_k, collection_count)
-            )
+            results = self.store.search(text_embedding, top_k)
         except Exception as e:
             print(f"❌ 向量检索失败: {e}")
             return []
 
-        # 修复相似度计算
-        search_results = []
-        if results["metadatas"] and results["metadatas"][0]:
-            for idx, metadata in enumerate(results["metadatas"][0]):
-                # 计算相似度分数（修复版）
-                if results["distances"] and results["distances"][0]:
-                    distance = results["distances"][0][idx]
-                    # ✅ 修复：使用 1.0 - (distance/2.0) 得到0-1范围的相似度
-                    # 余弦距离范围是0-2，所以除以2得到0-1范围
-                    similarity = 1.0 - (distance / 2.0)
-                    # 确保在0-1范围内
-                    similarity = max(0.0, min(1.0, similarity))
-                    print(
-                        f"📄 结果{idx + 1}: 距离={distance:.3f}, 相似度={similarity:.3f}, 文件={metadata.get('filename')}")
-                else:
-                    similarity = 0.5
-
-                search_results.append({
-                    "rank": idx + 1,
-                    "similarity_score": similarity,
-                    "path": metadata.get("path", ""),
-                    "filename": metadata.get("filename", "")
-                })
-
+        search_results = self._format_results(results)
         print(f"✅ 找到 {len(search_results)} 个相关结果")
         return search_results
 
+    def search_photos_batch(self, query_texts, top_k=10):
+        """批量语义搜索：所有查询的嵌入一起做一次向量检索，返回与 query_texts 一一对应的结果列表"""
+        results = [[] for _ in query_texts]
+        if not self.clip_available:
+            print("⚠️  CLIP不可用，无法进行语义搜索")
+            return results
+
+        print(f"🔍 批量语义搜索: {len(query_texts)} 个查询，每个查找 {top_k} 个结果")
+
+        # 查询嵌入与单条搜索共用缓存
+        positions, embeddings = [], []
+        for pos, query_text in enumerate(query_texts):
+            key = " ".join(query_text.split()).lower()
+            try:
+                embeddings.append(self._query_embedding(key))
+                positions.append(pos)
+            except ValueError:
+                print(f"❌ 文本嵌入生成失败: '{query_text}'")
+
+        if not positions or self.store.count() == 0:
+            return results
+
+        try:
+            hits = self.store.search_batch(np.stack(embeddings), top_k)
+        except Exception as e:
+            print(f"❌ 向量检索失败: {e}")
+            return results
+
+        for pos, query_hits in zip(positions, hits):
+            results[pos] = self._format_results(query_hits)
+        print(f"✅ 批量搜索完成: {sum(map(len, results))} 个结果")
+        return results
+
+    @staticmethod
+    def _format_results(results):
+        """把 [(余弦相似度, 元数据), ...] 转换为接口返回的结果列表"""
+        search_results = []
+        for idx, (cosine, metadata) in enumerate(results):
+            # 余弦相似度范围是-1~1，映射到0-1范围（与之前 1 - 余弦距离/2 的分数一致）
+            similarity = max(0.0, min(1.0, (1.0 + cosine) / 2.0))
+            print(f"📄 结果{idx + 1}: 余弦={cosine:.3f}, 相似度={similarity:.3f}, 文件={metadata.get('filename')}")
+
+            search_results.append({
+                "rank": idx + 1,
+                "similarity_score": similarity,
+                "path": metadata.get("path", ""),
+                "filename": metadata.get("filename", "")
+            })
+        return search_results
+
     def clear_collection(self):
         """清空向量数据库"""
         try:
-            self.client.delete_collection(name=self.collection.name)
+            self.store.clear()
             print("✅ 已清空向量数据库")
         except Exception as e:
             print(f"❌ 清空向量数据库失败: {e}")
-        self.collection = self.client.get_or_create_collection(name=self.collection.name)
 
     def get_collection_stats(self):
         """获取集合统计信息"""
-        count = self.collection.count()
+        count = self.store.count()
         return {
             "total_photos": count,
-            "collection_name": self.collection.name,
+            "collection_name": self.store.name,
             "clip_available": self.clip_available,
             "device": self.device
         }
\ No newline at end of file
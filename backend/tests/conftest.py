@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 后端模块按 backend/ 目录下的平铺方式互相导入（from config import ...）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
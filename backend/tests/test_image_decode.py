@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("xxhash")
+pytest.importorskip("PIL")
+
+from image_decode import load_clip_thumbnail
+from photo_quality_checker import PhotoQualityChecker, map_file
+
+
+@pytest.mark.parametrize("shape", [(1200, 1600), (300, 500), (2000, 240)])
+def test_disk_thumbnail_matches_quality_thumbnail(tmp_path, shape):
+    # 质量检测阶段附带的缩略图与直接从磁盘生成的缩略图必须逐像素一致，否则嵌入随缓存命中与否变化
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, size=(*shape, 3), dtype=np.uint8)
+    path = str(tmp_path / "photo.jpg")
+    assert cv2.imwrite(path, img)
+
+    result = PhotoQualityChecker().check_photo_quality_decoded(path, 224)
+    assert not result["is_defective"]
+    expected = result["thumbnail"]
+
+    assert np.array_equal(load_clip_thumbnail(path, 224), expected)
+    with map_file(path) as buf:
+        assert np.array_equal(load_clip_thumbnail(path, 224, buf), expected)
+    assert expected.shape == (224, 224, 3)
+
+
+def test_unreadable_file_returns_none(tmp_path):
+    path = tmp_path / "broken.jpg"
+    path.write_bytes(b"not an image")
+    assert load_clip_thumbnail(str(path), 224) is None
@@ -0,0 +1,113 @@
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("xxhash")
+
+import photo_quality_checker
+from photo_quality_checker import PhotoQualityChecker, QualityCache
+
+
+@pytest.fixture
+def photo(tmp_path):
+    rng = np.random.default_rng(0)
+    path = str(tmp_path / "photo.jpg")
+    assert cv2.imwrite(path, rng.integers(0, 256, size=(240, 320, 3), dtype=np.uint8))
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = QualityCache(PhotoQualityChecker(), path=str(tmp_path / "quality.sqlite3"))
+    yield cache
+    cache.close()
+
+
+def _check_and_store(cache, path, embed_size=None, photo_hash="abc"):
+    [(signature, cached)] = cache.lookup([path], embed_size)
+    assert cached is None
+    result = cache.checker.check_photo_quality(path)
+    result["hash"] = photo_hash
+    cache.store([(path, signature, result)], embed_size)
+    return result
+
+
+def test_hit_after_store_reapplies_thresholds(cache, photo):
+    result = _check_and_store(cache, photo)
+
+    [(signature, cached)] = cache.lookup([photo])
+    assert signature is not None
+    assert cached["hash"] == "abc"
+    assert cached["is_defective"] == result["is_defective"]
+    assert cached["details"]["blur"]["score"] == pytest.approx(result["details"]["blur"]["score"])
+
+    # 阈值在命中时重新套用，调整阈值不必清空缓存
+    cache.checker.blur_threshold = result["details"]["blur"]["score"] + 1
+    [(_, cached)] = cache.lookup([photo])
+    assert cached["is_defective"]
+
+
+def test_miss_after_file_changes(cache, photo):
+    _check_and_store(cache, photo)
+
+    st = os.stat(photo)
+    os.utime(photo, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    [(_, cached)] = cache.lookup([photo])
+    assert cached is None
+
+
+def test_modes_are_cached_separately(cache, photo):
+    _check_and_store(cache, photo)
+
+    [(_, cached)] = cache.lookup([photo], embed_size=224)
+    assert cached is None
+    _check_and_store(cache, photo, embed_size=224, photo_hash="def")
+    assert cache.lookup([photo])[0][1]["hash"] == "abc"
+    assert cache.lookup([photo], embed_size=224)[0][1]["hash"] == "def"
+
+
+def test_corrupt_row_is_a_miss(cache, photo):
+    _check_and_store(cache, photo)
+    with cache._conn:
+        cache._conn.execute("UPDATE quality SET blur = NULL")
+
+    [(signature, cached)] = cache.lookup([photo])
+    assert signature is not None
+    assert cached is None
+
+
+def test_settings_change_clears_cache(cache, photo, monkeypatch):
+    _check_and_store(cache, photo)
+    cache.close()
+
+    monkeypatch.setattr(photo_quality_checker, "_CACHE_SETTINGS", "changed")
+    reopened = QualityCache(cache.checker, path=cache.path)
+    try:
+        [(_, cached)] = reopened.lookup([photo])
+        assert cached is None
+    finally:
+        reopened.close()
+
+    with sqlite3.connect(cache.path) as conn:
+        assert conn.execute("SELECT value FROM settings WHERE key = 'metrics'").fetchone() == ("changed",)
+
+
+def test_missing_file_has_no_signature(cache, tmp_path):
+    [(signature, cached)] = cache.lookup([str(tmp_path / "missing.jpg")])
+    assert signature is None
+    assert cached is None
+
+
+def test_failed_checks_are_not_stored(cache, photo):
+    [(signature, _)] = cache.lookup([photo])
+    cache.store([(photo, signature, {"image_path": photo, "is_defective": False, "defect_types": [], "details": {}})])
+    assert cache.lookup([photo])[0][1] is None
+
+
+def test_clear(cache, photo):
+    _check_and_store(cache, photo)
+    cache.clear()
+    assert cache.lookup([photo])[0][1] is None
@@ -0,0 +1,44 @@
+# numba 融合内核与 OpenCV 实现（cv2.Laplacian + meanStdDev、compare + countNonZero）的结果应一致
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("numba")
+pytest.importorskip("xxhash")
+
+import photo_quality_checker as pqc
+
+
+def _synthetic_images():
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:120, 0:160]
+    return {
+        "noise": rng.integers(0, 256, size=(97, 131), dtype=np.uint8),
+        "gradient": ((xx + yy) % 256).astype(np.uint8),
+        "checkerboard": (((yy // 8 + xx // 8) % 2) * 255).astype(np.uint8),
+        "constant": np.full((40, 30), 128, dtype=np.uint8),
+        "tiny": rng.integers(0, 256, size=(3, 3), dtype=np.uint8),
+        # 超过 EXPOSURE_SAMPLE_PIXELS，曝光按步长抽样
+        "large": rng.integers(0, 256, size=(1001, 1003), dtype=np.uint8),
+    }
+
+
+@pytest.fixture(scope="module")
+def checker():
+    return pqc.PhotoQualityChecker()
+
+
+@pytest.mark.parametrize("name", list(_synthetic_images()))
+def test_kernel_matches_opencv(checker, name):
+    img = _synthetic_images()[name]
+
+    blur, exposure = checker._quality_metrics(img)
+    expected_blur = checker._blur_metrics(img)
+    expected_exposure = checker._exposure_metrics(img)
+
+    # OpenCV 用单精度计算拉普拉斯响应，内核按整数精确计算
+    assert blur["score"] == pytest.approx(expected_blur["score"], rel=1e-4, abs=1e-6)
+    assert blur["is_defective"] == expected_blur["is_defective"]
+    assert exposure["overexposed_ratio"] == pytest.approx(expected_exposure["overexposed_ratio"])
+    assert exposure["underexposed_ratio"] == pytest.approx(expected_exposure["underexposed_ratio"])
+    assert exposure["defect_type"] == expected_exposure["defect_type"]
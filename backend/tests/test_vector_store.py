@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("orjson")
+
+import vector_store
+from vector_store import PhotoVectorStore
+
+DIM = 16
+
+
+def _vectors(n, seed=0):
+    rng = np.random.default_rng(seed)
+    v = rng.standard_normal((n, DIM)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def _store(tmp_path, **kwargs):
+    kwargs.setdefault("hash_name", "xxh3_128")
+    kwargs.setdefault("quantize", False)
+    return PhotoVectorStore("test", directory=str(tmp_path), use_gpu=False, **kwargs)
+
+
+def _upsert(store, vectors, prefix="h"):
+    hashes = [f"{prefix}{i}" for i in range(len(vectors))]
+    metadatas = [{"hash": h, "path": f"/photos/{h}.jpg", "filename": f"{h}.jpg"} for h in hashes]
+    store.upsert(hashes, vectors, metadatas)
+    return hashes
+
+
+def test_upsert_and_search(tmp_path):
+    store = _store(tmp_path)
+    vectors = _vectors(20)
+    _upsert(store, vectors)
+
+    assert store.count() == 20
+    results = store.search(vectors[7], 3)
+    assert len(results) == 3
+    assert results[0][1]["hash"] == "h7"
+    assert results[0][0] == pytest.approx(1.0, abs=1e-5)
+    assert [s for s, _ in results] == sorted((s for s, _ in results), reverse=True)
+
+
+def test_upsert_replaces_same_hash(tmp_path):
+    store = _store(tmp_path)
+    vectors = _vectors(5)
+    _upsert(store, vectors)
+
+    replacement = _vectors(1, seed=1)
+    store.upsert(["h2"], replacement, [{"hash": "h2", "path": "/photos/moved.jpg", "filename": "moved.jpg"}])
+
+    assert store.count() == 5
+    assert store.hashes()["h2"] == "/photos/moved.jpg"
+    top = store.search(replacement[0], 1)[0]
+    assert top[1]["hash"] == "h2"
+    assert top[0] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_deferred_save_then_reload(tmp_path):
+    store = _store(tmp_path)
+    vectors = _vectors(10)
+    _upsert(store, vectors)
+    # 修改先留在内存中，未到 SAVE_INTERVAL 不写回
+    assert _store(tmp_path).count() == 0
+
+    store.flush()
+    reloaded = _store(tmp_path)
+    assert reloaded.count() == 10
+    assert reloaded.hashes() == store.hashes()
+    assert reloaded.search(vectors[4], 1)[0][1]["hash"] == "h4"
+
+    # 重新加载后继续追加，ID不与已有的冲突
+    _upsert(reloaded, _vectors(3, seed=2), prefix="n")
+    assert reloaded.count() == 13
+
+
+def test_hash_name_change_rebuilds(tmp_path):
+    store = _store(tmp_path)
+    _upsert(store, _vectors(4))
+    store.flush()
+
+    assert _store(tmp_path, hash_name="other").count() == 0
+
+
+def test_sq8_rerank_returns_exact_scores(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "SQ8_MIN_VECTORS", 64)
+    store = _store(tmp_path, quantize=True)
+    vectors = _vectors(200)
+    _upsert(store, vectors[:50])
+    assert not store.quantized
+    _upsert(store, vectors[50:], prefix="q")
+    assert store.quantized
+
+    query = _vectors(1, seed=3)[0]
+    results = store.search(query, 5)
+    exact = vectors @ query
+    expected = np.sort(exact)[::-1][:5]
+    assert [s for s, _ in results] == pytest.approx(expected.tolist(), abs=1e-5)
+
+    # 量化状态和原始向量文件随索引一起保存，重新加载后仍做精确重排
+    store.flush()
+    reloaded = _store(tmp_path, quantize=True)
+    assert reloaded.quantized
+    assert [s for s, _ in reloaded.search(query, 5)] == pytest.approx(expected.tolist(), abs=1e-5)
+
+
+def test_load_truncates_unsaved_vector_rows(tmp_path):
+    store = _store(tmp_path, quantize=True)
+    _upsert(store, _vectors(6))
+    store.flush()
+    size = (tmp_path / "test.vectors.f32").stat().st_size
+
+    # 追加后未写回元数据就退出：多出的行在下次加载时截掉
+    _upsert(store, _vectors(2, seed=4), prefix="x")
+    assert (tmp_path / "test.vectors.f32").stat().st_size > size
+
+    reloaded = _store(tmp_path, quantize=True)
+    assert reloaded.count() == 6
+    assert (tmp_path / "test.vectors.f32").stat().st_size == size
+
+
+def test_clear_removes_files(tmp_path):
+    store = _store(tmp_path, quantize=True)
+    _upsert(store, _vectors(3))
+    store.flush()
+    store.clear()
+
+    assert store.count() == 0
+    assert store.search(_vectors(1)[0], 3) == []
+    assert not list(tmp_path.iterdir())
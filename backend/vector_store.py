@@ -0,0 +1,293 @@
+import os
+import time
+import threading
+from functools import lru_cache
+
+import numpy as np
+import orjson
+
+from config import config
+
+# 启用 VECTOR_SQ8 时，向量数达到该值才改用8位标量量化索引（用已有向量训练每一维的量化范围）；
+# 照片较少时精确索引的内存本就很小，也没有足够的数据训练
+SQ8_MIN_VECTORS = 4096
+# 量化索引先取 top_k × RERANK_FACTOR（至少 RERANK_MIN）个候选，再用原始向量精确重排
+RERANK_FACTOR = 10
+RERANK_MIN = 100
+# 修改后至少间隔这么多秒才自动写回磁盘（每次写回都要完整重写索引和元数据），其余由 flush 写回
+SAVE_INTERVAL = 30
+
+
+@lru_cache(maxsize=None)
+def _faiss():
+    """按需导入faiss（只在语义搜索进程中使用）"""
+    import faiss
+    return faiss
+
+
+def _gpu_count():
+    """可用的GPU数量；faiss-cpu 没有GPU接口，返回0"""
+    faiss = _faiss()
+    return faiss.get_num_gpus() if hasattr(faiss, "StandardGpuResources") else 0
+
+
+class PhotoVectorStore:
+    """基于FAISS的照片向量库
+
+    向量已做L2归一化，IndexFlatIP 的内积即余弦相似度。照片以内容哈希区分，
+    FAISS中使用自增的整数ID，元数据按ID保存在字典中，两者一同持久化到磁盘。
+
+    quantize 为真时另把原始float32向量按ID顺序追加到磁盘文件，向量数达到 SQ8_MIN_VECTORS 后
+    索引改为8位标量量化（IndexScalarQuantizer QT_8bit，内存约为1/4）；检索时先在量化索引中
+    取较多候选，再读取（内存映射）这些候选的原始向量精确重排，返回的分数是精确内积。
+    """
+
+    def __init__(self, name="photo_collection", directory=config.CHROMA_DB_DIR_STR, hash_name=None,
+                 quantize=config.VECTOR_SQ8, use_gpu="gpu" in config.FEATURES):
+        self.name = name
+        # 照片ID所用的内容哈希算法，与磁盘上记录的不一致时旧ID无法匹配，从空库重建
+        self.hash_name = hash_name
+        self.quantize = quantize
+        # 装有GPU版faiss时，精确索引在GPU上保留一份只读副本用于检索（CPU索引仍负责修改和持久化）
+        self.use_gpu = use_gpu and _gpu_count() > 0
+        self._gpu_resources = None
+        self.index_path = os.path.join(directory, f"{name}.faiss")
+        self.meta_path = os.path.join(directory, f"{name}.meta.json")
+        self.vectors_path = os.path.join(directory, f"{name}.vectors.f32")
+        os.makedirs(directory, exist_ok=True)
+
+        # 索引线程和查询线程共用同一个库，修改和检索都要加锁
+        self._lock = threading.RLock()
+        self._dirty = False  # 内存中有尚未写回磁盘的修改
+        self._last_save = time.monotonic()
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self.index = None
+        self.metadata = {}  # FAISS ID -> {"path", "filename", "hash", ...}
+        self.ids_by_hash = {}  # 内容哈希 -> FAISS ID
+        self.next_id = 0
+        self.quantized = False  # 索引是否已改为8位标量量化
+        self._vectors = None  # 原始向量文件的内存映射，形状 (next_id, D)，按需打开
+        self._gpu_index = None  # GPU上的精确索引副本，索引修改后作废，下次检索时重建
+        self._gpu_ids = None  # GPU副本中第 i 行对应的FAISS ID
+
+    def _load(self):
+        """从磁盘读取索引和元数据，任一文件缺失或损坏时从空库开始"""
+        if not (os.path.exists(self.index_path) and os.path.exists(self.meta_path)):
+            return
+        try:
+            index = _faiss().read_index(self.index_path)
+            with open(self.meta_path, "rb") as f:
+                data = orjson.loads(f.read())
+        except Exception as e:
+            print(f"⚠️  读取向量库失败，将重新建立: {e}")
+            return
+        if data.get("hash_name") != self.hash_name:
+            print(f"⚠️  向量库的内容哈希算法已变更 ({data.get('hash_name')} -> {self.hash_name})，将重新建立")
+            return
+
+        self.index = index
+        self.metadata = {int(i): m for i, m in data["metadata"].items()}
+        self.ids_by_hash = {m["hash"]: i for i, m in self.metadata.items()}
+        self.next_id = data["next_id"]
+        self.quantized = data.get("quantized", False)
+        if self.quantize or self.quantized:
+            self._check_vectors_file()
+        print(f"✅ 已加载向量库: {len(self.metadata)} 张照片" + ("（8位量化）" if self.quantized else ""))
+
+    def _check_vectors_file(self):
+        """确认原始向量文件覆盖全部ID；精确索引可以从索引中还原缺失的文件，量化索引只能放弃重排"""
+        expected = self.next_id * self.index.d * 4
+        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else -1
+        if size >= expected:
+            if size > expected:
+                # 上次写入向量后未能保存元数据，多出的行没有对应ID，截掉
+                os.truncate(self.vectors_path, expected)
+            return
+        if self.quantized:
+            print("⚠️  原始向量文件缺失，量化索引的搜索结果将不做精确重排")
+            return
+        vectors = np.zeros((self.next_id, self.index.d), dtype=np.float32)
+        ids = np.fromiter(self.metadata.keys(), dtype=np.int64, count=len(self.metadata))
+        for i in ids.tolist():
+            vectors[i] = self.index.reconstruct(i)
+        with open(self.vectors_path, "wb") as f:
+            f.write(vectors.tobytes())
+        print(f"✅ 已从索引还原原始向量文件: {self.next_id} 行")
+
+    def _vector_rows(self):
+        """原始向量文件的只读内存映射（按FAISS ID取行），文件不完整时返回None"""
+        if self._vectors is None:
+            d = self.index.d
+            if self.next_id == 0 or not os.path.exists(self.vectors_path) \
+                    or os.path.getsize(self.vectors_path) < self.next_id * d * 4:
+                return None
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.next_id, d))
+        return self._vectors
+
+    def _build_quantized(self):
+        """用当前全部向量训练8位标量量化器，重建索引（ID不变）"""
+        faiss = _faiss()
+        rows = self._vector_rows()
+        if rows is None:
+            return
+        ids = np.fromiter(self.metadata.keys(), dtype=np.int64, count=len(self.metadata))
+        vectors = np.ascontiguousarray(rows[ids])
+        sq = faiss.IndexScalarQuantizer(self.index.d, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+        sq.train(vectors)
+        index = faiss.IndexIDMap2(sq)
+        index.add_with_ids(vectors, ids)
+        self.index = index
+        self.quantized = True
+        print(f"✅ 向量索引已改为8位标量量化: {len(ids)} 张照片")
+
+    def _save(self):
+        """先写临时文件再替换，避免中途退出留下不完整的索引"""
+        tmp_index = self.index_path + ".tmp"
+        tmp_meta = self.meta_path + ".tmp"
+        _faiss().write_index(self.index, tmp_index)
+        with open(tmp_meta, "wb") as f:
+            f.write(orjson.dumps(
+                {"hash_name": self.hash_name, "next_id": self.next_id, "quantized": self.quantized,
+                 "metadata": self.metadata},
+                option=orjson.OPT_NON_STR_KEYS
+            ))
+        os.replace(tmp_index, self.index_path)
+        os.replace(tmp_meta, self.meta_path)
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+    def _changed(self):
+        """记录一次修改，距上次写回超过 SAVE_INTERVAL 时顺便写回
+
+        原始向量文件在 upsert 时已追加写入；未写回前进程退出时，多出的向量行在下次加载时截掉，
+        这些照片下次处理时重新索引
+        """
+        self._dirty = True
+        if time.monotonic() - self._last_save >= SAVE_INTERVAL:
+            self._save()
+
+    def flush(self):
+        """把尚未写回的修改保存到磁盘（一次索引任务结束时、进程退出前调用）"""
+        with self._lock:
+            if self._dirty and self.index is not None:
+                self._save()
+
+    def _gpu_search(self, queries, k):
+        """在GPU副本上检索精确索引，副本不存在时先从CPU索引复制；返回值与 index.search 相同"""
+        faiss = _faiss()
+        if self._gpu_index is None:
+            if self._gpu_resources is None:
+                self._gpu_resources = faiss.StandardGpuResources()
+            # IndexIDMap2 内部的扁平索引按添加顺序存放向量，id_map 记录每一行的ID
+            flat = faiss.downcast_index(self.index.index)
+            self._gpu_index = faiss.index_cpu_to_gpu(self._gpu_resources, 0, flat)
+            self._gpu_ids = faiss.vector_to_array(self.index.id_map)
+        scores, rows = self._gpu_index.search(queries, k)
+        ids = np.where(rows >= 0, self._gpu_ids[np.maximum(rows, 0)], -1)
+        return scores, ids
+
+    def _remove(self, ids):
+        self.index.remove_ids(np.asarray(ids, dtype=np.int64))
+        for i in ids:
+            metadata = self.metadata.pop(i)
+            self.ids_by_hash.pop(metadata["hash"], None)
+
+    def count(self):
+        return len(self.metadata)
+
+    def upsert(self, hashes, embeddings, metadatas):
+        """添加照片向量，同一内容哈希已存在时覆盖
+
+        Args:
+            hashes: 内容哈希列表（批次内不重复）
+            embeddings: 与 hashes 对应的归一化向量，形状 (N, D)
+            metadatas: 与 hashes 对应的元数据字典，需包含 "hash"
+        """
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        with self._lock:
+            if self.index is None:
+                faiss = _faiss()
+                self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(vectors.shape[1]))
+
+            replaced = [self.ids_by_hash[h] for h in hashes if h in self.ids_by_hash]
+            if replaced:
+                self._remove(replaced)
+
+            ids = np.arange(self.next_id, self.next_id + len(hashes), dtype=np.int64)
+            self._gpu_index = None
+            if self.quantize or self.quantized:
+                # 第 i 行即 ID 为 i 的原始向量，只追加不改写（被替换的旧行保留，清空时一并删除）；
+                # 空库从头写，丢弃可能残留的旧文件
+                self._vectors = None
+                with open(self.vectors_path, "ab" if self.next_id else "wb") as f:
+                    f.write(vectors.tobytes())
+            self.next_id += len(hashes)
+            self.index.add_with_ids(vectors, ids)
+            for i, photo_hash, metadata in zip(ids.tolist(), hashes, metadatas):
+                self.metadata[i] = metadata
+                self.ids_by_hash[photo_hash] = i
+            if self.quantize and not self.quantized and len(self.metadata) >= SQ8_MIN_VECTORS:
+                self._build_quantized()
+            self._changed()
+
+    def hashes(self):
+        """返回 {内容哈希: 路径}"""
+        with self._lock:
+            return {m["hash"]: m["path"] for m in self.metadata.values()}
+
+    def update_metadata(self, updates):
+        """按内容哈希更新元数据（向量不变），updates: {内容哈希: 要更新的字段}"""
+        with self._lock:
+            for photo_hash, fields in updates.items():
+                i = self.ids_by_hash.get(photo_hash)
+                if i is not None:
+                    self.metadata[i].update(fields)
+            self._changed()
+
+    def search(self, embedding, top_k):
+        """返回与查询向量最相似的 [(余弦相似度, 元数据), ...]，按相似度从高到低排列"""
+        return self.search_batch(np.asarray(embedding, dtype=np.float32).reshape(1, -1), top_k)[0]
+
+    def search_batch(self, embeddings, top_k):
+        """一次检索多个查询向量（形状 (Q, D)），返回每个查询的 [(余弦相似度, 元数据), ...]
+
+        精确索引在GPU可用时于GPU上检索，多个查询合成一次矩阵乘法
+        """
+        queries = np.ascontiguousarray(embeddings, dtype=np.float32)
+        with self._lock:
+            if self.index is None or not self.metadata:
+                return [[] for _ in range(len(queries))]
+            rows = self._vector_rows() if self.quantized else None
+            if rows is None:
+                k = min(top_k, len(self.metadata))
+                if self.use_gpu and not self.quantized:
+                    scores, ids = self._gpu_search(queries, k)
+                else:
+                    scores, ids = self.index.search(queries, k)
+                return [
+                    [(float(s), self.metadata[i]) for s, i in zip(query_scores, query_ids.tolist()) if i != -1]
+                    for query_scores, query_ids in zip(scores, ids)
+                ]
+
+            # 量化索引：多取候选，再用原始向量计算精确内积重排
+            candidates = min(max(top_k * RERANK_FACTOR, RERANK_MIN), len(self.metadata))
+            _, ids = self.index.search(queries, candidates)
+            results = []
+            for query, query_ids in zip(queries, ids):
+                query_ids = query_ids[query_ids != -1]
+                exact = rows[query_ids] @ query
+                order = np.argsort(-exact)[:top_k]
+                results.append([(exact[j].item(), self.metadata[query_ids[j].item()]) for j in order])
+            return results
+
+    def clear(self):
+        """清空向量库并删除磁盘文件"""
+        with self._lock:
+            self._reset()
+            self._dirty = False
+            for path in (self.index_path, self.meta_path, self.vectors_path):
+                if os.path.exists(path):
+                    os.remove(path)
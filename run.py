@@ -3,11 +3,22 @@ import os
 import sys
 import webbrowser
 import time
+import argparse
 import subprocess
 from pathlib import Path
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="AI智能选片助手启动脚本")
+    parser.add_argument("--dev", action="store_true", help="开发模式：代码修改后自动重载（单进程）")
+    # 处理任务进度、已处理照片等状态保存在进程内存中，且每个worker会各自加载一份CLIP模型，
+    # 多个worker之间不共享这些状态，因此默认只开一个
+    parser.add_argument("--workers", type=int, default=1, help="生产模式下的uvicorn worker进程数（默认1）")
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
     print("🎨 AI智能选片助手 v2.0")
     print("=" * 60)
 
@@ -52,13 +63,21 @@ def main():
     # 启动后端服务（通过命令行调用uvicorn）
     try:
         # 使用subprocess启动uvicorn
-        process = subprocess.Popen([
+        command = [
             sys.executable, "-m", "uvicorn",
             "main:app",
             "--host", "0.0.0.0",
             "--port", "8001",
-            "--reload"
-        ])
+        ]
+        if args.dev:
+            command.append("--reload")
+        else:
+            # 生产模式：不监视文件变化；uvloop事件循环 + httptools解析HTTP（uvicorn[standard] 已包含），
+            # uvloop 不支持Windows，Windows上交给uvicorn默认的 auto 选择
+            command += ["--workers", str(args.workers)]
+            if sys.platform != "win32":
+                command += ["--loop", "uvloop", "--http", "httptools"]
+        process = subprocess.Popen(command)
 
         # 等待进程结束
         process.wait()